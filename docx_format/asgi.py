@@ -9,8 +9,57 @@ https://docs.djangoproject.com/en/3.1/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIHandler
+from django.http import FileResponse
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'docx_format.settings')
 
-application = get_asgi_application()
+
+class FormattingASGIHandler(ASGIHandler):
+    '''
+        Django 3.2 iterates streaming responses on the event loop, so an archive response
+        waiting for formatting jobs between its chunks would hold up every other request.
+        Chunks of streaming responses are made in a thread instead.
+        File responses only read from disk and are sent as Django sends them.
+    '''
+    async def send_response(self, response, send):
+        if not response.streaming or isinstance(response, FileResponse):
+            await super().send_response(response, send)
+            return
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': get_response_headers(response),
+        })
+        parts = iter(response)
+        next_part = sync_to_async(next, thread_sensitive=False)
+        while True:
+            part = await next_part(parts, None)
+            if part is None:
+                break
+            for chunk, _ in self.chunk_bytes(part):
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body'})
+        await sync_to_async(response.close, thread_sensitive=True)()
+
+
+def get_response_headers(response):
+    '''
+        Returns headers and cookies of a response as ASGIHandler.send_response sends them.
+    '''
+    headers = []
+    for header, value in response.items():
+        if isinstance(header, str):
+            header = header.encode('ascii')
+        if isinstance(value, str):
+            value = value.encode('latin1')
+        headers.append((bytes(header), bytes(value)))
+    for cookie in response.cookies.values():
+        headers.append((b'Set-Cookie', cookie.output(header='').encode('ascii').strip()))
+    return headers
+
+
+django.setup(set_prefix=False)
+application = FormattingASGIHandler()
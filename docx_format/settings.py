@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 from .secret import DJANGO_SECRET_KEY
 
@@ -125,4 +126,87 @@ STATIC_ROOT = BASE_DIR / 'static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media/'
 VALID_EXTENSION = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
-MAX_DOCUMENT_SIZE = 5242880
\ No newline at end of file
+MAX_DOCUMENT_SIZE = 150 * 1024 * 1024
+# Larger uploads are spooled to disk by Django and formatted from the file.
+FILE_UPLOAD_MAX_MEMORY_SIZE = 5 * 1024 * 1024
+MAX_ARCHIVE_SIZE = 200 * 1024 * 1024
+# Documents of an archive over these limits are not formatted and reported as errors in its manifest.
+MAX_ARCHIVE_DOCUMENTS = 200
+MAX_ARCHIVE_UNCOMPRESSED_SIZE = 1024 * 1024 * 1024
+# Formatted documents above this size are spooled to a temporary file before sending.
+FORMATTED_DOCUMENT_SPOOL_SIZE = 10 * 1024 * 1024
+
+# Formatting runs in a pool of worker processes, 0 formats on the request thread.
+FORMATTING_POOL_SIZE = os.cpu_count()
+FORMATTING_POOL_MAX_JOBS_PER_WORKER = 50
+FORMATTING_POOL_MAX_WORKER_RSS = 1024 * 1024 * 1024
+
+# The async format view runs formatting requests in a pool of FORMATTING_VIEW_THREADS threads
+# and answers 503 with Retry-After when FORMATTING_VIEW_MAX_PENDING requests are already
+# running or waiting, or when a request takes longer than FORMATTING_VIEW_DEADLINE seconds.
+FORMATTING_VIEW_THREADS = FORMATTING_POOL_SIZE or 1
+FORMATTING_VIEW_MAX_PENDING = 4 * FORMATTING_VIEW_THREADS
+FORMATTING_VIEW_DEADLINE = 120
+FORMATTING_VIEW_RETRY_AFTER = 30
+
+# Images are downscaled to their displayed size at IMAGE_OPTIMIZATION_DPI and recompressed.
+# Requires Pillow.
+IMAGE_OPTIMIZATION = False
+IMAGE_OPTIMIZATION_DPI = 150
+IMAGE_OPTIMIZATION_JPEG_QUALITY = 85
+IMAGE_OPTIMIZATION_THREADS = 4
+
+# Compression of saved documents by policy name: deflate level 0-9 and media, which is
+# 'deflate', 'store' or 'auto' (JPEG, PNG and GIF are stored, other images deflated).
+# Requests can pick a policy by name, FORMATTING_COMPRESSION is used otherwise.
+FORMATTING_COMPRESSION_POLICIES = {
+    'default': {'level': 6, 'media': 'auto'},
+    'fast': {'level': 1, 'media': 'store'},
+    'small': {'level': 9, 'media': 'deflate'},
+}
+FORMATTING_COMPRESSION = 'default'
+
+# Style profile (formatting standard) of documents whose request doesn't pick one
+# of format.services.style_profiles.STYLE_PROFILES by name.
+FORMATTING_STYLE_PROFILE = 'standard'
+
+# Formatted documents are cached on disk by a hash of the upload and options, 0 disables the cache.
+FORMATTED_CACHE_DIR = BASE_DIR / 'cache/formatted'
+FORMATTED_CACHE_MAX_SIZE = 512 * 1024 * 1024
+
+# Formatted paragraphs of the last upload of every user and document name are kept,
+# so that a resubmitted document only formats its changed paragraphs. Anonymous uploads
+# are only tracked when they already have a session. 0 disables it.
+INCREMENTAL_FORMATTING_DIR = BASE_DIR / 'cache/paragraphs'
+INCREMENTAL_FORMATTING_MAX_LINEAGES = 1000
+
+# Documents whose main part (word/document.xml) is at least this large are formatted
+# by the streaming engine, which keeps only a few paragraphs in memory at a time.
+# The engine doesn't reuse paragraphs of previous uploads. None never streams, 0 always does.
+STREAMING_FORMATTING_MIN_SIZE = 32 * 1024 * 1024
+
+# Formatting stages are reported in a Server-Timing header and logged by format.timing.
+FORMATTING_TIMING = DEBUG
+
+# Formatting jobs are profiled with cProfile and tracemalloc when a staff user
+# sends a profile parameter or at a sampling rate per route name, e.g. {'format': 0.01}.
+FORMATTING_PROFILE_DIR = BASE_DIR / 'profiles'
+FORMATTING_PROFILE_SAMPLING = {}
+FORMATTING_PROFILE_MAX_FILES = 200
+FORMATTING_PROFILE_MAX_AGE = 7 * 24 * 60 * 60
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'format.timing': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+    },
+}
@@ -0,0 +1,51 @@
+'''
+    Times saving a formatted document with every compression policy.
+'''
+from io import BytesIO
+from time import perf_counter
+from format.services.prepare_doc import prepare_to_format
+from format.services.package_writer import CompressionPolicy
+
+POLICIES = {
+    **{f'deflate-{level}': CompressionPolicy(level, 'deflate') for level in range(10)},
+    'store': CompressionPolicy(6, 'store'),
+    'auto': CompressionPolicy(6, 'auto'),
+}
+
+
+def time_save(formatter, policy, repeat):
+    '''
+        Returns the best time of repeat saves and the size of the saved document.
+    '''
+    best = None
+    for _ in range(repeat):
+        output = BytesIO()
+        start = perf_counter()
+        formatter.save(output, policy)
+        seconds = perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best, len(output.getvalue())
+
+def benchmark(data, hyphenation=False, repeat=3, policies=POLICIES):
+    '''
+        Saves a formatted document with every policy, once copying unchanged members
+        of the template and the source as they are and once compressing every part.
+        Returns dict policy name -> {'seconds', 'bytes', 'full_seconds', 'full_bytes'}.
+    '''
+    formatter = prepare_to_format(BytesIO(data), hyphenation)
+    formatter.style_document()
+    raw_members = formatter.raw_members
+    results = {}
+    for name, policy in policies.items():
+        formatter.raw_members = raw_members
+        seconds, size = time_save(formatter, policy, repeat)
+        formatter.raw_members = None
+        full_seconds, full_size = time_save(formatter, policy, repeat)
+        results[name] = {
+            'seconds': seconds,
+            'bytes': size,
+            'full_seconds': full_seconds,
+            'full_bytes': full_size,
+        }
+    formatter.raw_members = raw_members
+    return results
@@ -0,0 +1,40 @@
+'''
+    Compares copy engines of prepare_to_format on a run-heavy document.
+    Usage: python -m format.benchmarks.copy_runs [paragraphs] [runs per paragraph]
+'''
+import sys
+from time import perf_counter
+from docx import Document
+from format.services.prepare_doc import COPY_ENGINES
+
+
+def make_run_heavy_document(paragraphs, runs):
+    document = Document()
+    for i in range(paragraphs):
+        paragraph = document.add_paragraph()
+        for j in range(runs):
+            run = paragraph.add_run(f'run {i}.{j} ')
+            run.bold = j % 2 == 0
+            run.italic = j % 3 == 0
+            run.underline = j % 5 == 0
+            run.font.superscript = j % 7 == 0
+    return document
+
+def time_engine(engine, src_document):
+    dest_document = Document()
+    start = perf_counter()
+    for paragraph in src_document.paragraphs:
+        engine(paragraph, dest_document.add_paragraph())
+    return perf_counter() - start
+
+def main(paragraphs=2000, runs=10):
+    src_document = make_run_heavy_document(paragraphs, runs)
+    results = {name: time_engine(engine, src_document) for name, engine in COPY_ENGINES.items()}
+    for name, seconds in results.items():
+        print(f'{name:>5}: {seconds:.3f}s ({paragraphs * runs / seconds:.0f} runs/s)')
+    print(f'speedup: {results["docx"] / results["xml"]:.1f}x')
+    return results
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
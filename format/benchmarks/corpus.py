@@ -0,0 +1,165 @@
+'''
+    Generator of synthetic .docx documents for benchmarks.
+'''
+import zlib
+import random
+import struct
+from io import BytesIO
+from docx import Document
+from docx.enum.text import WD_BREAK
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls, qn
+from docx.text.paragraph import Paragraph
+
+CORPUS_SIZES = {
+    'small': {'paragraphs': 200, 'lists': 10, 'images': 5, 'headers': 5, 'hyperlinks': 20},
+    'medium': {'paragraphs': 2000, 'lists': 100, 'images': 25, 'headers': 25, 'hyperlinks': 200},
+    'large': {'paragraphs': 10000, 'lists': 500, 'images': 100, 'headers': 100, 'hyperlinks': 1000},
+    'appendix': {'paragraphs': 200, 'headers': 5, 'hyperlinks': 20, 'table_cells': 10000},
+}
+
+LIST_ITEMS = 5
+LIST_LEVELS = ('decimal', 'lowerLetter', 'bullet')
+TABLE_COLUMNS = 4
+
+
+def make_document(paragraphs, lists=0, images=0, headers=0, hyperlinks=0, image_size=(320, 240), photos=False, table_cells=0):
+    '''
+        Returns bytes of a document with paragraphs of body text and
+        lists, images with captions, headers after page breaks and hyperlinks
+        spread evenly between them.
+        Every list has LIST_ITEMS items over the levels of a multi-level numbering.
+        photos - every image is a distinct picture of noise that can't be compressed,
+        otherwise three solid color pictures are repeated.
+        table_cells - size of a table of TABLE_COLUMNS columns appended at the end.
+    '''
+    document = Document()
+    number_list, bullet_list = add_numbering(document)
+    if photos:
+        pictures = [make_png(*image_size, noise=i) for i in range(images)]
+    else:
+        pictures = [make_png(*image_size, color=(i * 40 % 256, 96, 160)) for i in range(3)]
+    document.add_paragraph('Title')
+
+    extras = (
+        [('header', i) for i in range(headers)] +
+        [('list', i) for i in range(lists)] +
+        [('image', i) for i in range(images)]
+    )
+    step = max(1, paragraphs // (len(extras) + 1))
+    link_step = max(1, paragraphs // hyperlinks) if hyperlinks else 0
+    for i in range(paragraphs):
+        paragraph = document.add_paragraph(f'Body text paragraph {i}. ')
+        run = paragraph.add_run('Emphasis')
+        run.bold = i % 2 == 0
+        run.italic = i % 3 == 0
+        paragraph.add_run(' and the rest of the sentence.')
+        if link_step and i % link_step == 0:
+            add_hyperlink(paragraph, f'https://example.com/{i}', 'link')
+        if i % step == step - 1 and extras:
+            kind, number = extras.pop(0)
+            if kind == 'header':
+                add_header(document, f'Chapter {number}')
+            elif kind == 'list':
+                num_id = number_list if number % 2 == 0 else bullet_list
+                add_list(document, num_id, number)
+            else:
+                document.add_picture(BytesIO(pictures[number % len(pictures)]))
+                document.add_paragraph(f'Image {number} caption')
+    if table_cells:
+        add_table(document, table_cells)
+    output = BytesIO()
+    document.save(output)
+    return output.getvalue()
+
+def add_header(document, text):
+    document.add_paragraph().add_run().add_break(WD_BREAK.PAGE)
+    document.add_paragraph(text)
+    document.add_paragraph().add_run('Section').bold = True
+
+def add_table(document, cells):
+    '''
+        Adds a table with a bold run in the first cell of every row
+        and a hyperlink in every tenth row.
+    '''
+    table = document.add_table(rows=max(1, cells // TABLE_COLUMNS), cols=TABLE_COLUMNS)
+    for i, tc in enumerate(table._tbl.iter(qn('w:tc'))):
+        paragraph = Paragraph(tc.p_lst[0], table)
+        paragraph.add_run(f'Cell {i} ').bold = i % TABLE_COLUMNS == 0
+        if i % (TABLE_COLUMNS * 10) == 1:
+            add_hyperlink(paragraph, f'https://example.com/cell/{i}', 'link')
+
+def add_list(document, num_id, number):
+    for item in range(LIST_ITEMS):
+        paragraph = document.add_paragraph(f'List {number} item {item}')
+        numPr = paragraph._p.get_or_add_pPr().get_or_add_numPr()
+        numPr.get_or_add_ilvl().val = item % len(LIST_LEVELS)
+        numPr.get_or_add_numId().val = num_id
+
+def add_hyperlink(paragraph, url, text):
+    rId = paragraph.part.relate_to(url, RT.HYPERLINK, is_external=True)
+    hyperlink = parse_xml(
+        f'<w:hyperlink {nsdecls("w", "r")} r:id="{rId}">'
+        f'<w:r><w:rPr><w:color w:val="0563C1"/><w:u w:val="single"/></w:rPr><w:t>{text}</w:t></w:r>'
+        f'</w:hyperlink>'
+    )
+    paragraph._p.append(hyperlink)
+
+def add_numbering(document):
+    '''
+        Adds a multi-level numbering and a bullet numbering.
+        Returns their numIds.
+    '''
+    numbering = document.part.numbering_part.element
+    abstract_ids = [int(a.get(qn('w:abstractNumId'))) for a in numbering.iterchildren(qn('w:abstractNum'))]
+    num_ids = [int(n.get(qn('w:numId'))) for n in numbering.iterchildren(qn('w:num'))]
+    abstract_id = max(abstract_ids, default=-1) + 1
+    num_id = max(num_ids, default=0) + 1
+
+    result = []
+    for offset, formats in enumerate((LIST_LEVELS, ('bullet',) * len(LIST_LEVELS))):
+        levels = ''.join(
+            f'<w:lvl w:ilvl="{ilvl}"><w:start w:val="1"/><w:numFmt w:val="{number_format}"/>'
+            f'<w:lvlText w:val="%{ilvl + 1}."/></w:lvl>'
+            for ilvl, number_format in enumerate(formats)
+        )
+        abstract_num = parse_xml(
+            f'<w:abstractNum {nsdecls("w")} w:abstractNumId="{abstract_id + offset}">{levels}</w:abstractNum>'
+        )
+        num = parse_xml(
+            f'<w:num {nsdecls("w")} w:numId="{num_id + offset}">'
+            f'<w:abstractNumId w:val="{abstract_id + offset}"/></w:num>'
+        )
+        first_num = next(numbering.iterchildren(qn('w:num')), None)
+        if first_num is not None:
+            first_num.addprevious(abstract_num)
+        else:
+            numbering.append(abstract_num)
+        numbering.append(num)
+        result.append(num_id + offset)
+    return result
+
+def make_png(width, height, color=(0, 0, 0), noise=None):
+    '''
+        Returns bytes of a solid color RGB png
+        or of random pixels seeded with noise.
+    '''
+    if noise is None:
+        raw = (b'\x00' + bytes(color) * width) * height
+    else:
+        pixels = random.Random(noise)
+        raw = b''.join(b'\x00' + pixels.randbytes(width * 3) for _ in range(height))
+
+    def chunk(kind, data):
+        return (
+            struct.pack('>I', len(data)) + kind + data +
+            struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+        )
+
+    return (
+        b'\x89PNG\r\n\x1a\n' +
+        chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)) +
+        chunk(b'IDAT', zlib.compress(raw)) +
+        chunk(b'IEND', b'')
+    )
@@ -0,0 +1,111 @@
+'''
+    Times every stage of formatting a document separately.
+'''
+import tracemalloc
+from io import BytesIO
+from time import perf_counter
+from format.services.ImageExtractor import ImageExtractor
+from format.services.prepare_doc import prepare_to_format
+from format.services.constants import StyleNameConstants
+
+# Styling stages in the order style_document runs them.
+STYLE_STAGES = (
+    ('style_bullet_lists', StyleNameConstants.BULLET_LIST_STYLE),
+    ('style_number_lists', StyleNameConstants.NUMBER_LIST_STYLE),
+    ('style_headers', StyleNameConstants.HEADER_STYLE),
+    ('style_images', StyleNameConstants.IMAGE_STYLE),
+    ('style_image_captions', StyleNameConstants.IMAGE_CAPTION_STYLE),
+    ('style_text', StyleNameConstants.TEXT_STYLE),
+    ('style_tables', StyleNameConstants.TEXT_STYLE),
+)
+
+
+class StageRecorder:
+    '''
+        Records time and, optionally, peak traced memory of named stages.
+    '''
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.times = {}
+        self.peak_memory = {}
+
+    def run(self, name, function, *args):
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        start = perf_counter()
+        result = function(*args)
+        self.times[name] = perf_counter() - start
+        if self.trace_memory:
+            self.peak_memory[name] = tracemalloc.get_traced_memory()[1]
+        return result
+
+
+def run_stages(data, hyphenation=False, recorder=None):
+    '''
+        Formats a document given as bytes stage by stage.
+        Returns the recorder and the size of the formatted document.
+    '''
+    if recorder is None:
+        recorder = StageRecorder()
+    with ImageExtractor(BytesIO(data)) as extractor:
+        recorder.run('read_images', read_images, extractor)
+    formatter = recorder.run('prepare_to_format', prepare_to_format, BytesIO(data), hyphenation)
+    if not formatter.has_standard_styles:
+        recorder.run('add_standard_styles', formatter.add_standard_styles)
+    recorder.run('classify', lambda: formatter.index)
+    styles = formatter.document.styles
+    for method, style_name in STYLE_STAGES:
+        recorder.run(method, getattr(formatter, method), styles[style_name])
+    recorder.run('set_margins', formatter.set_margins, formatter.style_profile.margins)
+    recorder.run('add_page_numbers', formatter.add_page_numbers)
+    output = BytesIO()
+    recorder.run('save', formatter.save, output)
+    return recorder, len(output.getvalue())
+
+def read_images(extractor):
+    return [extractor.read_image(f'/{image_path}') for image_path in extractor.image_paths]
+
+def benchmark(data, hyphenation=False, repeat=3):
+    '''
+        Returns the best time of every stage over repeat runs
+        and peak traced memory of every stage from a separate run.
+    '''
+    best = {}
+    for _ in range(repeat):
+        recorder, output_size = run_stages(data, hyphenation)
+        for stage, seconds in recorder.times.items():
+            best[stage] = min(seconds, best.get(stage, seconds))
+    best['total'] = sum(best.values())
+
+    tracemalloc.start()
+    try:
+        recorder, _ = run_stages(data, hyphenation, StageRecorder(trace_memory=True))
+        peak_memory = dict(recorder.peak_memory)
+        peak_memory['total'] = max(peak_memory.values())
+    finally:
+        tracemalloc.stop()
+    return {
+        'input_bytes': len(data),
+        'output_bytes': output_size,
+        'seconds': best,
+        'peak_memory': peak_memory,
+    }
+
+def compare(results, baseline, threshold=0.2, noise=0.005):
+    '''
+        Returns regressions as (corpus, stage, baseline seconds, seconds) tuples.
+        A stage regresses when it is slower than the baseline by more than threshold
+        and by more than noise seconds.
+    '''
+    regressions = []
+    for corpus, result in results.items():
+        if corpus not in baseline:
+            continue
+        baseline_seconds = baseline[corpus]['seconds']
+        for stage, seconds in result['seconds'].items():
+            if stage not in baseline_seconds:
+                continue
+            expected = baseline_seconds[stage]
+            if seconds > expected * (1 + threshold) and seconds - expected > noise:
+                regressions.append((corpus, stage, expected, seconds))
+    return regressions
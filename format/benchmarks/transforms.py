@@ -0,0 +1,92 @@
+'''
+    Compares body-wide transforms with doing the same per paragraph through python-docx.
+    Usage: python -m format.benchmarks.transforms [paragraphs]
+'''
+import sys
+from io import BytesIO
+from time import perf_counter
+from lxml import etree
+from docx import Document
+from docx.shared import Pt
+from format.benchmarks.corpus import make_document
+from format.services.doc_formatter import DocumentFormatter
+from format.services import transforms
+
+
+def make_transform_heavy_document(paragraphs):
+    '''
+        Returns bytes of a document with a hyperlink in every paragraph
+        and fonts and sizes set directly on every run.
+    '''
+    document = Document(BytesIO(make_document(paragraphs, hyperlinks=paragraphs)))
+    for paragraph in document.paragraphs:
+        for run in paragraph.runs:
+            run.font.name = 'Arial'
+            run.font.size = Pt(12)
+    output = BytesIO()
+    document.save(output)
+    return output.getvalue()
+
+def remove_hyperlinks_per_paragraph(document):
+    for paragraph in document.paragraphs:
+        DocumentFormatter.remove_hyperlinks_from_paragraph(paragraph)
+
+def remove_hyperlinks(document):
+    body = document.element.body
+    return transforms.unwrap_hyperlinks(body) + transforms.reset_colors(body)
+
+def strip_direct_fonts_per_paragraph(document):
+    for paragraph in document.paragraphs:
+        for run in paragraph.runs:
+            rPr = run._r.rPr
+            if rPr is not None:
+                for property in rPr.xpath('./w:rFonts | ./w:sz | ./w:szCs'):
+                    rPr.remove(property)
+
+def strip_direct_fonts(document):
+    return transforms.strip_direct_fonts(document.element.body)
+
+def style_all_text_per_paragraph(document):
+    style = document.styles['Body Text']
+    for paragraph in document.paragraphs:
+        paragraph.style = style
+
+def style_all_text(document):
+    return DocumentFormatter(document).style_all_text(document.styles['Body Text'])
+
+# name -> (per paragraph implementation, body-wide transform)
+TRANSFORMS = {
+    'hyperlinks': (remove_hyperlinks_per_paragraph, remove_hyperlinks),
+    'direct_fonts': (strip_direct_fonts_per_paragraph, strip_direct_fonts),
+    'style_all_text': (style_all_text_per_paragraph, style_all_text),
+}
+
+
+def time_transform(transform, data):
+    '''
+        Returns seconds the transform took, what it returned and the resulting body.
+    '''
+    document = Document(BytesIO(data))
+    start = perf_counter()
+    result = transform(document)
+    seconds = perf_counter() - start
+    return seconds, result, etree.tostring(document.element.body)
+
+def main(paragraphs=5000):
+    data = make_transform_heavy_document(paragraphs)
+    results = {}
+    for name, (per_paragraph, bulk) in TRANSFORMS.items():
+        per_paragraph_seconds, _, expected = time_transform(per_paragraph, data)
+        seconds, nodes, body = time_transform(bulk, data)
+        if body != expected:
+            raise AssertionError(f'{name}: the body-wide transform differs from the per paragraph one')
+        results[name] = {'per_paragraph': per_paragraph_seconds, 'bulk': seconds, 'nodes': nodes}
+        print(
+            f'{name:>14}: {per_paragraph_seconds:.3f}s per paragraph, {seconds:.3f}s bulk, '
+            f'{nodes} nodes, speedup {per_paragraph_seconds / seconds:.1f}x'
+        )
+    return results
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -12,3 +12,27 @@ class WrongFileExtensionException(Exception):
 
     def __str__(self):
         return self.message
+
+
+class WrongArchiveException(Exception):
+    def __init__(self):
+        self.message = 'Please, upload a zip archive of docx files'
+
+    def __str__(self):
+        return self.message
+
+
+class ArchiveLimitException(Exception):
+    def __init__(self):
+        self.message = 'The archive has too many documents or they are too large in total'
+
+    def __str__(self):
+        return self.message
+
+
+class ServerBusyException(Exception):
+    def __init__(self):
+        self.message = 'The server is busy, please try again later'
+
+    def __str__(self):
+        return self.message
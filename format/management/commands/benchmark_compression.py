@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from format.benchmarks.corpus import CORPUS_SIZES, make_document
+from format.benchmarks.compression import benchmark
+
+
+class Command(BaseCommand):
+    help = 'Times saving formatted synthetic documents with every compression policy'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', nargs='+', choices=CORPUS_SIZES, default=['small', 'medium'],
+            help='Synthetic corpus sizes to run'
+        )
+        parser.add_argument('--repeat', type=int, default=3, help='Saves per policy, the best time is kept')
+        parser.add_argument('--hyphen', action='store_true', help='Use the template with hyphenation')
+        parser.add_argument(
+            '--photos', action='store_true',
+            help='Use distinct incompressible images instead of repeated solid color ones'
+        )
+
+    def handle(self, *args, **options):
+        for size in options['sizes']:
+            data = make_document(**CORPUS_SIZES[size], image_size=(800, 600), photos=options['photos'])
+            results = benchmark(data, options['hyphen'], options['repeat'])
+            self.stdout.write(f'{size}: {len(data)} bytes in')
+            self.stdout.write(f'    {"policy":<12} {"save":>9} {"bytes":>10} {"full save":>10} {"bytes":>10}')
+            for name, result in results.items():
+                self.stdout.write(
+                    f'    {name:<12} {result["seconds"] * 1000:7.1f}ms {result["bytes"]:>10}'
+                    f' {result["full_seconds"] * 1000:8.1f}ms {result["full_bytes"]:>10}'
+                )
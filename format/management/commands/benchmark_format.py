@@ -0,0 +1,67 @@
+import json
+import platform
+from pathlib import Path
+from datetime import datetime, timezone
+from django.core.management.base import BaseCommand, CommandError
+from format.benchmarks.corpus import CORPUS_SIZES, make_document
+from format.benchmarks.stages import benchmark, compare
+
+DEFAULT_BASELINE = Path(__file__).resolve().parents[2] / 'benchmarks/baseline.json'
+
+
+class Command(BaseCommand):
+    help = 'Times every formatting stage on synthetic documents and compares the results with a baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', nargs='+', choices=CORPUS_SIZES, default=['small', 'medium'],
+            help='Synthetic corpus sizes to run'
+        )
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per corpus, the best time is kept')
+        parser.add_argument('--hyphen', action='store_true', help='Use the template with hyphenation')
+        parser.add_argument('--output', type=Path, help='File to write results to as JSON')
+        parser.add_argument('--baseline', type=Path, default=DEFAULT_BASELINE, help='Baseline results')
+        parser.add_argument('--save-baseline', action='store_true', help='Store results as the new baseline')
+        parser.add_argument(
+            '--threshold', type=float, default=0.2,
+            help='Relative slowdown of a stage that counts as a regression'
+        )
+
+    def handle(self, *args, **options):
+        results = {}
+        for size in options['sizes']:
+            data = make_document(**CORPUS_SIZES[size])
+            results[size] = benchmark(data, options['hyphen'], options['repeat'])
+            self.write_result(size, results[size])
+
+        report = {
+            'created': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'results': results,
+        }
+        if options['output']:
+            options['output'].write_text(json.dumps(report, indent=4))
+        if options['save_baseline']:
+            options['baseline'].write_text(json.dumps(report, indent=4))
+            self.stdout.write(self.style.SUCCESS(f'Baseline saved to {options["baseline"]}'))
+            return
+        if not options['baseline'].exists():
+            self.stdout.write(f'No baseline at {options["baseline"]}, run with --save-baseline to create it')
+            return
+
+        baseline = json.loads(options['baseline'].read_text())['results']
+        regressions = compare(results, baseline, options['threshold'])
+        for corpus, stage, expected, seconds in regressions:
+            self.stderr.write(f'{corpus} {stage}: {expected:.4f}s -> {seconds:.4f}s')
+        if regressions:
+            raise CommandError(f'{len(regressions)} stages are slower than the baseline')
+        self.stdout.write(self.style.SUCCESS('No regressions against the baseline'))
+
+    def write_result(self, size, result):
+        self.stdout.write(
+            f'{size}: {result["input_bytes"]} bytes in, {result["output_bytes"]} bytes out'
+        )
+        for stage, seconds in result['seconds'].items():
+            peak_memory = result['peak_memory'].get(stage, 0) / 1024 / 1024
+            self.stdout.write(f'    {stage:<22} {seconds:8.4f}s {peak_memory:8.2f} MB')
@@ -0,0 +1,122 @@
+import os
+import glob
+from pathlib import Path
+from time import perf_counter
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from format.services.executor import FormattingExecutor, format_bytes, get_result
+from format.services.style_profiles import STYLE_PROFILES
+
+FORMATTED_SUFFIX = '_formatted'
+
+
+class Command(BaseCommand):
+    help = 'Formats .docx files found in directories or glob patterns'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='Directories, files or glob patterns')
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Number of worker processes, 0 formats in this process'
+        )
+        parser.add_argument('--hyphen', action='store_true', help='Use the template with hyphenation')
+        parser.add_argument(
+            '--compression', choices=list(settings.FORMATTING_COMPRESSION_POLICIES),
+            help='Compression policy of the formatted files, FORMATTING_COMPRESSION by default'
+        )
+        parser.add_argument(
+            '--style-profile', choices=list(STYLE_PROFILES),
+            help='Style profile of the formatted files, FORMATTING_STYLE_PROFILE by default'
+        )
+        parser.add_argument(
+            '--output-dir', type=Path,
+            help='Directory for formatted files, by default they are saved next to the sources'
+        )
+        parser.add_argument(
+            '--skip-up-to-date', action='store_true',
+            help='Skip documents whose formatted file is newer than the source'
+        )
+
+    def handle(self, *args, **options):
+        jobs = list(find_documents(options['paths'], options['output_dir']))
+        if not jobs:
+            raise CommandError('No .docx files found')
+        if options['skip_up_to_date']:
+            jobs = [(src, dest) for src, dest in jobs if not is_up_to_date(src, dest)]
+
+        executor = FormattingExecutor(options['workers'])
+        start = perf_counter()
+        futures = [
+            (src, executor.submit(format_file, src, dest, options['hyphen'], options['compression'], options['style_profile']))
+            for src, dest in jobs
+        ]
+        times = []
+        input_bytes = 0
+        failed = 0
+        for src, future in futures:
+            result = get_result(future)
+            if isinstance(result, Exception):
+                failed += 1
+                self.stderr.write(f'{src}: {result}')
+                continue
+            seconds, size = result
+            times.append(seconds)
+            input_bytes += size
+            self.stdout.write(f'{src} ({seconds:.2f}s)')
+        elapsed = perf_counter() - start
+        executor.shutdown()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Formatted {len(times)} documents, {failed} failed in {elapsed:.2f}s'
+        ))
+        if times:
+            self.stdout.write(
+                f'{len(times) / elapsed:.2f} documents/s, '
+                f'{input_bytes / elapsed / 1024 / 1024:.2f} MB/s, '
+                f'p50 {percentile(times, 50):.3f}s, '
+                f'p95 {percentile(times, 95):.3f}s per document'
+            )
+
+
+def find_documents(paths, output_dir=None):
+    '''
+        Yields (source, destination) pairs for every .docx file in paths.
+        Directory structure is kept in output_dir.
+    '''
+    for path in paths:
+        if os.path.isdir(path):
+            root = Path(path)
+            sources = sorted(root.rglob('*.docx'))
+        else:
+            root = None
+            sources = sorted(Path(match) for match in glob.glob(path, recursive=True))
+        for src in sources:
+            if src.name.startswith('~$') or src.stem.endswith(FORMATTED_SUFFIX):
+                continue
+            name = f'{src.stem}{FORMATTED_SUFFIX}.docx'
+            if output_dir is None:
+                dest = src.with_name(name)
+            elif root is not None:
+                dest = output_dir / src.relative_to(root).with_name(name)
+            else:
+                dest = output_dir / name
+            yield src, dest
+
+def is_up_to_date(src, dest):
+    return dest.exists() and dest.stat().st_mtime >= src.stat().st_mtime
+
+def format_file(src, dest, hyphenation=False, compression=None, style_profile=None):
+    '''
+        Formats a file and returns (seconds spent, size of the source in bytes).
+    '''
+    start = perf_counter()
+    data = src.read_bytes()
+    formatted_doc = format_bytes(data, hyphenation, compression=compression, style_profile=style_profile)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    dest.write_bytes(formatted_doc)
+    return perf_counter() - start, len(data)
+
+def percentile(values, percent):
+    values = sorted(values)
+    index = max(0, -(-len(values) * percent // 100) - 1)
+    return values[index]
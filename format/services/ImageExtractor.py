@@ -1,26 +1,78 @@
 from zipfile import ZipFile
-from pathlib import Path
-from django.conf import settings
+from docx.opc.constants import CONTENT_TYPE as CT
+from docx.opc.package import PartFactory, Unmarshaller
+from docx.opc.packuri import CONTENT_TYPES_URI, PACKAGE_URI, PackURI
+from docx.opc.phys_pkg import _ZipPkgReader
+from docx.oxml.ns import nsdecls
+from docx.opc.pkgreader import PackageReader, _ContentTypeMap
+from docx.package import Package
+from .package_writer import read_raw_member
+
+EMPTY_DOCUMENT = f'<w:document {nsdecls("w")}><w:body/></w:document>'.encode()
 
 class ImageExtractor:
-    '''Extract images in docx files'''
+    '''
+        Reads images of a docx file on demand.
+        The archive is opened on first use and closed by close() or when leaving a with block.
+    '''
     def __init__(self, path_to_file):
-        self.document = ZipFile(path_to_file, 'r')
-        self.image_paths = self.__get_images()
-        Path(settings.MEDIA_ROOT / 'images').mkdir(parents=True, exist_ok=True)
-    
-
-    def extract_images(self):
-        '''Extracts an image from docx'''
-        image_names = []
-        image_folder = Path(settings.MEDIA_ROOT / 'images')
-        for image_path in self.image_paths:
-            image = self.document.open(image_path).read()
-            image_name = image_path.split('/')[-1]
-            image_names.append(image_name)
-            with open(image_folder / image_name, 'wb') as file:
-                file.write(image)
-        return image_names
+        self.path = path_to_file
+        self._document = None
+        self._image_paths = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def document(self):
+        if self._document is None:
+            self._document = ZipFile(self.path, 'r')
+        return self._document
+
+    @property
+    def image_paths(self):
+        if self._image_paths is None:
+            self._image_paths = self.__get_images()
+        return self._image_paths
+
+    def close(self):
+        if self._document is not None:
+            self._document.close()
+            self._document = None
+
+    def open_document(self, body=True):
+        '''
+            Opens the docx with python-docx without decompressing its images.
+            Image parts of the returned document are empty, their blobs are read with read_image.
+            With body=False the main document part isn't parsed either and the document
+            has an empty body, the body is read with open_part instead.
+            The returned document can't be saved.
+        '''
+        reader = LazyImageReader(self.document, body)
+        content_types = reader.content_types
+        package_rels = PackageReader._srels_for(reader, PACKAGE_URI)
+        parts = PackageReader._load_serialized_parts(reader, package_rels, content_types)
+        package = Package()
+        Unmarshaller.unmarshal(PackageReader(content_types, package_rels, parts), package, PartFactory)
+        document_part = package.main_document_part
+        if document_part.content_type != CT.WML_DOCUMENT_MAIN:
+            raise ValueError(f'file is not a Word file, content type is {document_part.content_type}')
+        return document_part.document
+
+    def open_part(self, partname):
+        '''Returns a binary stream of a part, e.g. /word/document.xml'''
+        return self.document.open(PackURI(partname).membername)
+
+    def read_image(self, partname):
+        '''Returns the blob of an image part, e.g. /word/media/image1.png'''
+        return self.document.read(PackURI(partname).membername)
+
+    def read_raw_image(self, partname):
+        '''Returns an image part as a RawMember or None if it can't be copied compressed'''
+        return read_raw_member(self.document, PackURI(partname).membername)
 
     def __get_images(self):
         '''Returns list of image paths in docx'''
@@ -28,4 +80,35 @@ class ImageExtractor:
         image_paths = list(filter(lambda x: x.startswith('word/media/'), all_files))
         return image_paths
 
-    
+
+class LazyImageReader(_ZipPkgReader):
+    '''
+        python-docx package reader over an already open zip.
+        Leaves image parts empty instead of reading them and doesn't close the zip.
+        Without body the main document part is read as a document with an empty body.
+    '''
+    def __new__(cls, zip_file, body=True):
+        # PhysPkgReader.__new__ picks a reader class by the type of its argument.
+        return object.__new__(cls)
+
+    def __init__(self, zip_file, body=True):
+        self._zipf = zip_file
+        self.body = body
+        self.content_types = _ContentTypeMap.from_xml(zip_file.read(CONTENT_TYPES_URI.membername))
+
+    def blob_for(self, pack_uri):
+        content_type = self.__get_content_type(pack_uri)
+        if content_type.startswith('image/'):
+            return b''
+        if not self.body and content_type == CT.WML_DOCUMENT_MAIN:
+            return EMPTY_DOCUMENT
+        return super().blob_for(pack_uri)
+
+    def __get_content_type(self, pack_uri):
+        try:
+            return self.content_types[pack_uri]
+        except KeyError:
+            return ''
+
+    def close(self):
+        pass
@@ -0,0 +1,121 @@
+import os
+import json
+from shutil import copyfileobj
+from tempfile import TemporaryDirectory
+from pathlib import PurePosixPath
+from zipfile import ZipFile, ZIP_DEFLATED, ZIP_STORED
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from format.exceptions import ArchiveLimitException
+from .executor import get_executor
+
+
+class StreamBuffer:
+    '''
+        Unseekable file that collects everything written to it
+        until the written chunk is taken by a response.
+    '''
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        chunk = b''.join(self.chunks)
+        self.chunks = []
+        return chunk
+
+
+def read_archive(archive, validate_document):
+    '''
+        Returns names of valid documents in the archive
+        and a manifest with an entry for every file in it.
+        Members are checked with validate_document and against MAX_ARCHIVE_DOCUMENTS
+        and MAX_ARCHIVE_UNCOMPRESSED_SIZE without decompressing them, see extract_documents.
+    '''
+    names = []
+    manifest = {}
+    total_size = 0
+    with ZipFile(archive) as zip_file:
+        for member in zip_file.infolist():
+            if member.is_dir():
+                continue
+            try:
+                validate_document(UploadedFile(
+                    name=member.filename,
+                    content_type=get_content_type(member.filename),
+                    size=member.file_size
+                ))
+                if (len(names) >= settings.MAX_ARCHIVE_DOCUMENTS
+                        or total_size + member.file_size > settings.MAX_ARCHIVE_UNCOMPRESSED_SIZE):
+                    raise ArchiveLimitException
+            except Exception as e:
+                manifest[member.filename] = {'status': 'error', 'error': str(e)}
+                continue
+            names.append(member.filename)
+            total_size += member.file_size
+            manifest[member.filename] = {'status': 'pending'}
+    archive.seek(0)
+    return names, manifest
+
+def extract_documents(archive, names, directory):
+    '''
+        Yields (index, source path, destination path) of the named archive members one at a time,
+        a member is only decompressed to a file in directory when it is asked for.
+    '''
+    with ZipFile(archive) as zip_file:
+        for index, name in enumerate(names):
+            src_path, dest_path = get_document_paths(directory, index)
+            with zip_file.open(name) as member, open(src_path, 'wb') as src:
+                copyfileobj(member, src)
+            yield index, src_path, dest_path
+
+def get_document_paths(directory, index):
+    return os.path.join(directory, f'{index}.docx'), os.path.join(directory, f'{index}_formatted.docx')
+
+def remove_files(*paths):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+def get_content_type(name):
+    if name.lower().endswith('.docx'):
+        return settings.VALID_EXTENSION
+    return None
+
+def get_formatted_name(name):
+    path = PurePosixPath(name)
+    return str(path.with_name(f'{path.stem}_formatted.docx'))
+
+def stream_formatted_archive(archive, names, manifest, hyphenation=False, compression=None, style_profile=None, profile_name=None):
+    '''
+        Formats the named documents of an uploaded archive in parallel and yields chunks of a zip archive.
+        Documents are extracted to temporary files as the executor has room for them,
+        workers format them from and to files, so they don't pass through this process's memory.
+        Every document is written as soon as it is formatted and its files are removed,
+        manifest.json with the status of every file goes last.
+        profile_name - profile of the view, which is no longer current once the response streams.
+    '''
+    stream = StreamBuffer()
+    with TemporaryDirectory(dir=settings.FILE_UPLOAD_TEMP_DIR) as directory:
+        documents = extract_documents(archive, names, directory)
+        with ZipFile(stream, 'w', ZIP_DEFLATED) as output:
+            for index, result in get_executor().format_many(documents, hyphenation, compression, style_profile, profile_name):
+                name = names[index]
+                src_path, dest_path = get_document_paths(directory, index)
+                if isinstance(result, Exception):
+                    remove_files(src_path, dest_path)
+                    manifest[name] = {'status': 'error', 'error': str(result) or type(result).__name__}
+                    continue
+                formatted_name = get_formatted_name(name)
+                output.write(dest_path, formatted_name, compress_type=ZIP_STORED)
+                remove_files(src_path, dest_path)
+                manifest[name] = {'status': 'ok', 'output': formatted_name}
+                yield stream.pop()
+            output.writestr('manifest.json', json.dumps(manifest, ensure_ascii=False, indent=4))
+        yield stream.pop()
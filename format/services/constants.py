@@ -9,6 +9,7 @@ class HeaderConstants:
     LINE_SPACING = 1.5
     SPACING_AFTER = Pt(12)
     SPACING_BEFORE = Pt(0)
+    ALL_CAPS = True
     
 
 class TextConstants:
@@ -47,3 +48,28 @@ class StyleNameConstants:
     HEADER_STYLE = 'c2441105-ee4d-4f28-85ec-295e5b95de61'
     IMAGE_STYLE = '01029261-cb3b-4e98-844c-aae1131ed2b6'
     IMAGE_CAPTION_STYLE = '64491bd9-5b36-418a-965e-9e97299d1d31'
+
+
+# Journal article profile: single spaced 12 pt text on 20 mm margins.
+
+class JournalHeaderConstants(HeaderConstants):
+    FONT_SIZE = Pt(12)
+    LINE_SPACING = 1.0
+    SPACING_AFTER = Pt(6)
+    ALL_CAPS = False
+
+class JournalTextConstants(TextConstants):
+    FONT_SIZE = Pt(12)
+    LINE_SPACING = 1.0
+    FIRST_LINE_INDENT = Mm(10)
+
+class JournalPageConstants(PageConstants):
+    MARGIN_LEFT = Mm(20)
+    MARGIN_RIGHT = Mm(20)
+
+class JournalImageCaptionConstants(ImageCaptionConstants):
+    FONT_SIZE = Pt(10)
+
+class JournalListConstants(JournalTextConstants):
+    LEFT_INDENT = Mm(0)
+    FIRST_LINE_INDENT = Mm(0)
@@ -1,13 +1,33 @@
 from docx import Document
+from docx.document import Document as DocxDocument
 from docx.shared import Mm, Pt, RGBColor
 from docx.enum.style import WD_STYLE_TYPE, WD_BUILTIN_STYLE
 from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
 from docx.enum.text import WD_BREAK
 from docx.oxml.ns import qn
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
 from docx.parts.image import ImagePart
 from docx.text.paragraph import Paragraph
 from docx.oxml.xmlchemy import OxmlElement
-from .constants import HeaderConstants, TextConstants, PageConstants, ListConstants, StyleNameConstants, ImageConstants, ImageCaptionConstants
+from copy import deepcopy
+from .constants import StyleNameConstants
+from .style_profiles import STANDARD_PROFILE
+from .paragraph_index import ParagraphIndex, ParagraphKind
+from .package_writer import save_package, DEFAULT_POLICY
+from .transforms import set_paragraph_style, unwrap_hyperlinks, reset_colors, strip_direct_fonts, get_paragraphs
+
+
+STANDARD_STYLE_NAMES = (
+    StyleNameConstants.HEADER_STYLE,
+    StyleNameConstants.NUMBER_LIST_STYLE,
+    StyleNameConstants.BULLET_LIST_STYLE,
+    StyleNameConstants.IMAGE_STYLE,
+    StyleNameConstants.IMAGE_CAPTION_STYLE,
+)
+
+
+W_STYLE = qn('w:style')
+W_STYLE_ID = qn('w:styleId')
 
 
 class DocumentFormatter:
@@ -15,23 +35,56 @@ class DocumentFormatter:
         MS Word document formatter.
         Reads document in specified path and formats it.
     '''
-    def __init__(self, document=None):
+    def __init__(self, document=None, images=None):
         '''
             Distinguish style is needed in order to emphasize certain parts of the document.
             It will be removed befor saving.
+            document can also be an already opened python-docx Document.
+            images - ImageExtractor the document was opened with by open_document,
+            image blobs are read from it on demand.
         '''
-        self.document = Document(document)
+        if isinstance(document, DocxDocument):
+            self.document = document
+        else:
+            self.document = Document(document)
         self.path = document
+        self.images = images
         self.rels = self.__map_rels_to_images()
+        self.has_standard_styles = False
+        self._index = None
+        self._standard_style_ids = None
+        # w:p elements styling is limited to, None styles the whole body.
+        self.styled_paragraphs = None
+        # partname -> RawMember written by save without compressing it again, see package_writer.
+        self.raw_members = None
+        # StyleProfile the standard styles and margins are taken from.
+        self.style_profile = STANDARD_PROFILE
 
 
     def __map_rels_to_images(self):
         rels = {}
         for r in self.document.part.rels.values():
             if isinstance(r._target, ImagePart):
-                rels[r.rId] = r._target.partname.split('/')[-1]
+                rels[r.rId] = r._target
         return rels
 
+    def get_image_blob(self, rId):
+        '''
+            Returns the blob of the image referenced by rId.
+        '''
+        if self.images is not None:
+            return self.images.read_image(self.rels[rId].partname)
+        return self.rels[rId].blob
+
+    def get_raw_image(self, rId):
+        '''
+            Returns the still compressed image referenced by rId as a RawMember
+            or None if the document wasn't opened lazily.
+        '''
+        if self.images is None:
+            return None
+        return self.images.read_raw_image(self.rels[rId].partname)
+
     def set_margins(self, margins):
         '''
             Sets margins to the whole document.
@@ -77,8 +130,57 @@ class DocumentFormatter:
         )
         return added_style
 
+    @property
+    def index(self):
+        '''
+            Paragraph classification of the document body.
+            Built on first access and rebuilt after the body changes.
+        '''
+        if self._index is None or self._index.is_stale():
+            self._index = ParagraphIndex(self.document)
+        return self._index
+
+    def invalidate_index(self):
+        self._index = None
+
+    @property
+    def standard_style_ids(self):
+        '''
+            Ids of the standard styles that are present in the document.
+            Resolved once per formatter.
+        '''
+        if self._standard_style_ids is None:
+            style_ids = set()
+            for name in STANDARD_STYLE_NAMES:
+                try:
+                    style_ids.add(self.document.styles[name].style_id)
+                except KeyError:
+                    continue
+            self._standard_style_ids = style_ids
+        return self._standard_style_ids
+
+    def apply_style(self, elements, style):
+        '''
+            Sets a paragraph style to a list of w:p elements.
+            The style is resolved to its id once for the whole list.
+            Returns the number of styled paragraphs.
+        '''
+        style_id = self.document.part.get_style_id(style, WD_STYLE_TYPE.PARAGRAPH)
+        if self.styled_paragraphs is not None:
+            elements = [p for p in elements if p in self.styled_paragraphs]
+        count = 0
+        for p in elements:
+            set_paragraph_style(p, style_id)
+            count += 1
+        return count
+
+    def _paragraphs(self, kind):
+        body = self.document._body
+        return [Paragraph(p, body) for p in self.index.get(kind)]
+
     def insert_paragraph_after(self, paragraph, text=None, style=None):
         '''Insert a new paragraph after the given paragraph.'''
+        self.invalidate_index()
         new_p = OxmlElement('w:p')
         paragraph._p.addnext(new_p)
         new_para = Paragraph(new_p, paragraph._parent)
@@ -89,45 +191,33 @@ class DocumentFormatter:
         return new_para
 
     def get_headers(self):
-        headers = [self.document.paragraphs[0]]
-        secondary_headers = []
-        for i in range(1, len(self.document.paragraphs)):
-            for run in self.document.paragraphs[i].runs:
-                if 'w:br' in run._element.xml and 'type="page"' in run._element.xml:
-                    headers.append(self.document.paragraphs[i + 1])
-                    break
-                else:
-                    if not run.bold:
-                        break
-                secondary_headers.append(self.document.paragraphs[i])
-
+        headers = self._paragraphs(ParagraphKind.HEADER)
+        secondary_headers = self._paragraphs(ParagraphKind.SECONDARY_HEADER)
         return headers, secondary_headers
 
     def get_lists(self):
-        bullet_lists = []
-        number_lists = []
-        for paragraph in self.document.paragraphs:
-            if paragraph.style.name == 'List Number':
-                number_lists.append(paragraph)
-            elif paragraph.style.name == 'List Bullet':
-                bullet_lists.append(paragraph)
         return {
-            'bullet_lists': bullet_lists,
-            'number_lists': number_lists
+            'bullet_lists': self._paragraphs(ParagraphKind.BULLET_LIST),
+            'number_lists': self._paragraphs(ParagraphKind.NUMBER_LIST)
         }
 
     def get_images_and_captions(self):
-        images = []
-        captions = []
-        for i, paragraph in enumerate(self.document.paragraphs):
-            if '<a:graphicData' in paragraph._p.xml:
-                images.append(paragraph)
-                try:
-                    captions.append(self.document.paragraphs[i + 1])
-                except:
-                    print('last image doesn\'t have a caption')
+        images = self._paragraphs(ParagraphKind.IMAGE)
+        captions = self._paragraphs(ParagraphKind.IMAGE_CAPTION)
         return images, captions
 
+    def get_text(self):
+        '''
+            Returns paragraphs that are not headers, lists, images or captions.
+        '''
+        return self._paragraphs(ParagraphKind.TEXT)
+
+    def get_table_text(self):
+        '''
+            Returns paragraphs in table cells.
+        '''
+        return self._paragraphs(ParagraphKind.TABLE_TEXT)
+
 
     def show_style_in_ui(self, style):
         ''' 
@@ -136,74 +226,81 @@ class DocumentFormatter:
         style.hidden = False
         style.quick_style = True
 
-    def add_standard_header_style(self, style_name):
+    def add_standard_header_style(self, style_name, constants=None):
         '''
             Adds header style to the document and returns it.
-            Header takes its style from values, defined in constants
+            Header takes its style from values, defined in constants,
+            those of the formatter's style profile by default.
         '''
+        constants = constants or self.style_profile.header
         try:
             header_style = self.add_paragraph_style(style_name)
         except ValueError:
             header_style = self.document.styles[style_name]
         
         header_style.base_style = self.document.styles['Heading 1']
-        header_style.font.size = HeaderConstants.FONT_SIZE
-        header_style.font.name = HeaderConstants.FONT_NAME
-        header_style.font.color.rgb = HeaderConstants.FONT_COLOR
-        header_style.paragraph_format.alignment = HeaderConstants.ALIGNMENT
-        header_style.font.all_caps = True
-        header_style.paragraph_format.space_after = HeaderConstants.SPACING_AFTER
-        header_style.paragraph_format.line_spacing = HeaderConstants.LINE_SPACING
-        header_style.paragraph_format.space_before = HeaderConstants.SPACING_BEFORE
+        header_style.font.size = constants.FONT_SIZE
+        header_style.font.name = constants.FONT_NAME
+        header_style.font.color.rgb = constants.FONT_COLOR
+        header_style.paragraph_format.alignment = constants.ALIGNMENT
+        header_style.font.all_caps = constants.ALL_CAPS
+        header_style.paragraph_format.space_after = constants.SPACING_AFTER
+        header_style.paragraph_format.line_spacing = constants.LINE_SPACING
+        header_style.paragraph_format.space_before = constants.SPACING_BEFORE
         return header_style
 
-    def add_standard_text_style(self, style_name):
+    def add_standard_text_style(self, style_name, constants=None):
         '''
             Adds text style to the document and returns it.
-            Text takes its style from values, defined in constants
+            Text takes its style from values, defined in constants,
+            those of the formatter's style profile by default.
         '''
+        constants = constants or self.style_profile.text
         try:
             text_style = self.add_paragraph_style(style_name)
         except ValueError:
             text_style = self.document.styles[style_name]
         
         text_style.base_style = self.document.styles['Normal']
-        text_style.font.size = TextConstants.FONT_SIZE
-        text_style.font.name = TextConstants.FONT_NAME
-        text_style.font.color.rgb = TextConstants.FONT_COLOR
-        text_style.paragraph_format.alignment = TextConstants.ALIGNMENT
-        text_style.paragraph_format.line_spacing = TextConstants.LINE_SPACING
-        text_style.paragraph_format.first_line_indent = TextConstants.FIRST_LINE_INDENT
-        text_style.paragraph_format.space_after = TextConstants.SPACING_AFTER
+        text_style.font.size = constants.FONT_SIZE
+        text_style.font.name = constants.FONT_NAME
+        text_style.font.color.rgb = constants.FONT_COLOR
+        text_style.paragraph_format.alignment = constants.ALIGNMENT
+        text_style.paragraph_format.line_spacing = constants.LINE_SPACING
+        text_style.paragraph_format.first_line_indent = constants.FIRST_LINE_INDENT
+        text_style.paragraph_format.space_after = constants.SPACING_AFTER
         return text_style
 
-    def add_standard_image_style(self, style_name):
+    def add_standard_image_style(self, style_name, constants=None):
+        constants = constants or self.style_profile.image
         try:
             image_style = self.add_paragraph_style(style_name)
         except ValueError:
             image_style = self.document.styles[style_name]
 
-        image_style.paragraph_format.alignment = ImageCaptionConstants.ALIGNMENT
-        image_style.paragraph_format.first_line_indent = ImageCaptionConstants.FIRST_LINE_INDENT
+        image_style.paragraph_format.alignment = constants.ALIGNMENT
+        image_style.paragraph_format.first_line_indent = constants.FIRST_LINE_INDENT
         
 
         return image_style
 
-    def add_standard_image_caption_style(self, style_name):
+    def add_standard_image_caption_style(self, style_name, constants=None):
+        constants = constants or self.style_profile.image_caption
         try:
             image_caption_style = self.add_paragraph_style(style_name)
         except ValueError:
             image_caption_style = self.document.styles[style_name]
 
-        image_caption_style.paragraph_format.alignment = ImageCaptionConstants.ALIGNMENT
-        image_caption_style.paragraph_format.first_line_indent = ImageCaptionConstants.FIRST_LINE_INDENT
-        image_caption_style.font.size = ImageCaptionConstants.FONT_SIZE
-        image_caption_style.font.name = ImageCaptionConstants.FONT_NAME
-        image_caption_style.font.color.rgb = ImageCaptionConstants.FONT_COLOR
-        image_caption_style.paragraph_format.space_after = ImageCaptionConstants.SPACING_AFTER
+        image_caption_style.paragraph_format.alignment = constants.ALIGNMENT
+        image_caption_style.paragraph_format.first_line_indent = constants.FIRST_LINE_INDENT
+        image_caption_style.font.size = constants.FONT_SIZE
+        image_caption_style.font.name = constants.FONT_NAME
+        image_caption_style.font.color.rgb = constants.FONT_COLOR
+        image_caption_style.paragraph_format.space_after = constants.SPACING_AFTER
         return image_caption_style
 
-    def add_standard_list_style(self, style_name, type):
+    def add_standard_list_style(self, style_name, type, constants=None):
+        constants = constants or self.style_profile.list
         try:
             list_style = self.add_paragraph_style(style_name)
         except ValueError:
@@ -216,14 +313,14 @@ class DocumentFormatter:
         elif type == 'bullet':
             list_style.base_style = self.document.styles['List Bullet']
 
-        list_style.font.size = ListConstants.FONT_SIZE
-        list_style.font.name = ListConstants.FONT_NAME
-        list_style.font.color.rgb = ListConstants.FONT_COLOR
-        list_style.paragraph_format.alignment = ListConstants.ALIGNMENT
-        list_style.paragraph_format.line_spacing = ListConstants.LINE_SPACING
-        list_style.paragraph_format.first_line_indent = ListConstants.FIRST_LINE_INDENT
-        list_style.paragraph_format.space_after = ListConstants.SPACING_AFTER
-        list_style.paragraph_format.left_indent = ListConstants.LEFT_INDENT
+        list_style.font.size = constants.FONT_SIZE
+        list_style.font.name = constants.FONT_NAME
+        list_style.font.color.rgb = constants.FONT_COLOR
+        list_style.paragraph_format.alignment = constants.ALIGNMENT
+        list_style.paragraph_format.line_spacing = constants.LINE_SPACING
+        list_style.paragraph_format.first_line_indent = constants.FIRST_LINE_INDENT
+        list_style.paragraph_format.space_after = constants.SPACING_AFTER
+        list_style.paragraph_format.left_indent = constants.LEFT_INDENT
         return list_style
 
     def add_standard_character_style(self, style_name):
@@ -238,6 +335,41 @@ class DocumentFormatter:
         '''
         return character_style
 
+    def add_standard_styles(self):
+        '''
+            Adds all standard styles of the formatter's style profile to the document.
+            style_document reuses them instead of building them again.
+        '''
+        self.add_standard_text_style(StyleNameConstants.TEXT_STYLE)
+        self.add_standard_list_style(StyleNameConstants.BULLET_LIST_STYLE, 'bullet')
+        self.add_standard_list_style(StyleNameConstants.NUMBER_LIST_STYLE, 'number')
+        self.add_standard_header_style(StyleNameConstants.HEADER_STYLE)
+        self.add_standard_image_style(StyleNameConstants.IMAGE_STYLE)
+        self.add_standard_image_caption_style(StyleNameConstants.IMAGE_CAPTION_STYLE)
+        self.has_standard_styles = True
+        self._standard_style_ids = None
+
+    def get_standard_style_elements(self):
+        '''
+            Returns w:style elements of the standard styles in the document, in document order.
+        '''
+        style_ids = self.standard_style_ids | {self.document.styles[StyleNameConstants.TEXT_STYLE].style_id}
+        return [style for style in self.document.styles.element.iterchildren(W_STYLE) if style.get(W_STYLE_ID) in style_ids]
+
+    def inject_styles(self, fragments):
+        '''
+            Adds ready-made w:style elements, e.g. a compiled style profile, to the document's styles
+            in one operation, replacing styles with the same ids.
+            fragments are copied, the same ones can be injected into any number of documents.
+        '''
+        styles = self.document.styles.element
+        style_ids = {fragment.get(W_STYLE_ID) for fragment in fragments}
+        for style in [style for style in styles.iterchildren(W_STYLE) if style.get(W_STYLE_ID) in style_ids]:
+            styles.remove(style)
+        styles.extend([deepcopy(fragment) for fragment in fragments])
+        self.has_standard_styles = True
+        self._standard_style_ids = None
+
     def style_document(
             self, 
             header_style=None, 
@@ -251,37 +383,30 @@ class DocumentFormatter:
         '''
             Styles whole document.
         '''
+        if not self.has_standard_styles:
+            self.add_standard_styles()
+        styles = self.document.styles
+
         if text_style is None:
-            text_style = self.add_standard_text_style(StyleNameConstants.TEXT_STYLE)
+            text_style = styles[StyleNameConstants.TEXT_STYLE]
             
         if bullet_style is None:
-            bullet_style = self.add_standard_list_style(
-                StyleNameConstants.BULLET_LIST_STYLE,
-                'bullet'
-            )
+            bullet_style = styles[StyleNameConstants.BULLET_LIST_STYLE]
             
         if number_style is None:
-            number_style = self.add_standard_list_style(
-                StyleNameConstants.NUMBER_LIST_STYLE,
-                'number'
-            )
+            number_style = styles[StyleNameConstants.NUMBER_LIST_STYLE]
             
         if header_style is None:
-            header_style = self.add_standard_header_style(StyleNameConstants.HEADER_STYLE)
+            header_style = styles[StyleNameConstants.HEADER_STYLE]
             
         if image_style is None:
-            image_style = self.add_standard_image_style(StyleNameConstants.IMAGE_STYLE)
+            image_style = styles[StyleNameConstants.IMAGE_STYLE]
 
         if image_caption_style is None:
-            image_caption_style = self.add_standard_image_caption_style(StyleNameConstants.IMAGE_CAPTION_STYLE)
+            image_caption_style = styles[StyleNameConstants.IMAGE_CAPTION_STYLE]
 
         if margins is None:
-            margins = (
-                PageConstants.MARGIN_TOP, 
-                PageConstants.MARGIN_LEFT, 
-                PageConstants.MARGIN_BOTTOM, 
-                PageConstants.MARGIN_RIGHT
-            )
+            margins = self.style_profile.margins
 
         self.style_bullet_lists(bullet_style)
         self.style_number_lists(number_style)
@@ -289,13 +414,12 @@ class DocumentFormatter:
         self.style_images(image_style)
         self.style_image_captions(image_caption_style)
         self.style_text(text_style)
+        self.style_tables(text_style)
         self.set_margins(margins)
         
 
     def style_images(self, style):
-        images, _ = self.get_images_and_captions()
-        for image in images:
-            image.style = style
+        self.apply_style(self.index.get(ParagraphKind.IMAGE), style)
 
     def remove_style_from_ui(self, style):
         '''
@@ -314,62 +438,49 @@ class DocumentFormatter:
         return self.insert_paragraph_after(next_paragraph, text)
 
     def add_page_break_before_paragraph(self, paragraph):
+        self.invalidate_index()
         previous_paragraph = paragraph.insert_paragraph_before()
         new_header = previous_paragraph.add_run()
         new_header.add_break(WD_BREAK.PAGE)
         
 
     def style_headers(self, style):
-        headers, _ = self.get_headers()
-        for header in headers:
-            header.style = style
+        self.apply_style(self.index.get(ParagraphKind.HEADER), style)
 
     def style_lists(self, bullet_style=None, number_style=None):
         if bullet_style is None:
             bullet_style = self.document.styles['List Bullet']
         if number_style is None:
             number_style = self.document.styles['List Number']
-        lists = self.get_lists()
-        
         self.style_bullet_lists(bullet_style)
         self.style_number_lists(number_style)
 
     def style_bullet_lists(self, bullet_style=None):
-        bullet_lists = self.get_lists()['bullet_lists']
-
         if bullet_style is None:
             bullet_style = self.document.styles['List Bullet']
-        
-        for list in bullet_lists:
-            list.style = bullet_style
+        self.apply_style(self.index.get(ParagraphKind.BULLET_LIST), bullet_style)
         
     def style_number_lists(self, number_style=None):
-        number_lists = self.get_lists()['number_lists']
-        if number_lists is None:
-            return
-
         if number_style is None:
             number_style = self.document.styles['List Number']
-        
-        for list in number_lists:
-            list.style = number_style
+        self.apply_style(self.index.get(ParagraphKind.NUMBER_LIST), number_style)
 
     def style_image_captions(self, style):
         _, captions = self.get_images_and_captions()
         
         for i, caption in enumerate(captions):
             caption.text = f'Рисунок {i + 1} — ' + caption.text
-            caption.style = style
+        self.apply_style([caption._p for caption in captions], style)
 
     def add_style(self, style, type):
         self.document.styles.add_style(style, type)
 
     def style_all_text(self, style):
         '''
-            Applies a style to all text in the document
+            Applies a style to all text in the document.
+            Returns the number of styled paragraphs.
         '''
-        for paragraph in self.document.paragraphs:
-            paragraph.style = style
+        return self.apply_style(get_paragraphs(self.document.element.body), style)
 
     def style_text(self, style):
         '''
@@ -378,17 +489,18 @@ class DocumentFormatter:
             except headers(first paragraph after page break)
             and lists
         '''
-
-        for paragraph in self.document.paragraphs:
-            if (
-                paragraph.style.name != StyleNameConstants.HEADER_STYLE and
-                paragraph.style.name != StyleNameConstants.NUMBER_LIST_STYLE and
-                paragraph.style.name != StyleNameConstants.BULLET_LIST_STYLE and
-                paragraph.style.name != StyleNameConstants.IMAGE_STYLE and
-                paragraph.style.name != StyleNameConstants.IMAGE_CAPTION_STYLE
-            ):
-                paragraph.style = style
+        excluded_style_ids = self.standard_style_ids
+        self.apply_style(
+            [p for p in self.index.get(ParagraphKind.TEXT) if p.style not in excluded_style_ids],
+            style
+        )
         
+    def style_tables(self, style):
+        '''
+            Applies a style to all paragraphs in table cells.
+        '''
+        self.apply_style(self.index.get(ParagraphKind.TABLE_TEXT), style)
+
     def add_page_numbers(self):
         footer_paragraph = self.document.sections[0].footer.paragraphs[0]
         run = footer_paragraph.add_run()
@@ -412,35 +524,64 @@ class DocumentFormatter:
         element.set(qn(name), value)
 
     def remove_hyperlinks(self):
-        for paragraph in self.document.paragraphs:
-            self.remove_hyperlinks_from_paragraph(paragraph)
-
-    def remove_hyperlinks_from_paragraph(self, paragraph):
-        p = paragraph._p
-        for link in p.xpath("./w:hyperlink"):
-            link_content = link.getchildren()
-            for element in link_content:
-                link.addprevious(element)
-            p.remove(link)
+        '''
+            Replaces hyperlinks of body paragraphs with their content and makes their runs black,
+            each in one pass over the body, see transforms.
+            Returns the numbers of unwrapped hyperlinks and recoloured runs.
+        '''
+        self.invalidate_index()
+        body = self.document.element.body
+        return {
+            'unwrapped_hyperlinks': unwrap_hyperlinks(body),
+            'recoloured_runs': reset_colors(body),
+        }
+
+    def strip_direct_fonts(self):
+        '''
+            Removes fonts and sizes set directly on runs of body paragraphs.
+            Returns the number of removed properties.
+        '''
+        return strip_direct_fonts(self.document.element.body)
+
+    @staticmethod
+    def remove_hyperlinks_from_paragraph(paragraph):
+        '''
+            Same as remove_hyperlinks for one paragraph, through python-docx.
+        '''
+        unwrap_hyperlinks(paragraph._p)
         for run in paragraph.runs:
             run.font.color.rgb = RGBColor(0, 0, 0)
 
     def get_numbering_object(self):
-        return self.document.part.numbering_part.numbering_definitions._numbering
+        '''
+            Returns the w:numbering element or None if the document has no numbering part.
+            python-docx can't make a numbering part for documents without one.
+        '''
+        part = self.document.part
+        if not any(rel.reltype == RT.NUMBERING for rel in part.rels.values()):
+            return None
+        return part.numbering_part.numbering_definitions._numbering
 
     def clear_list_formatting(self):
+        self.invalidate_index()
         lists = self.get_lists()
-        for list in lists:
+        for list in lists['bullet_lists'] + lists['number_lists']:
             runs = list.runs
             list.clear()
             for run in runs:
                 run = list.add_run(run.text)
 
-    def save(self, name):
+    def save(self, name, compression=None):
         '''
             Saves formatted document using provided name.
+            compression - CompressionPolicy of the saved parts.
         '''
-        self.document.save(name)
+        if self.images is not None:
+            raise ValueError('A document opened without its images can\'t be saved')
+        if self.raw_members is not None or compression is not None:
+            save_package(self.document.part.package, name, self.raw_members or {}, compression or DEFAULT_POLICY)
+        else:
+            self.document.save(name)
 
 #Code for making Table of Contents
 
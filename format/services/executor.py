@@ -0,0 +1,344 @@
+import os
+import resource
+import multiprocessing
+from itertools import count
+from io import BytesIO
+from threading import Lock
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import django
+from django.apps import apps
+from django.conf import settings
+from .prepare_doc import prepare_to_format
+from .templates import load_template
+from .image_optimizer import get_image_optimizer
+from .paragraph_cache import get_paragraph_cache
+from .package_writer import get_compression_policy
+from .style_profiles import STYLE_PROFILES
+from .streaming import stream_format, should_stream
+from . import timing
+from . import profiling
+
+
+class FormattingExecutor:
+    '''
+        Runs formatting jobs in a pool of pre-warmed worker processes.
+        The pool is replaced by a fresh one after max_jobs_per_worker jobs per worker
+        or when a worker grows over max_worker_rss bytes.
+        Jobs go to the old pool until every worker of the replacement has warmed up,
+        jobs already running in a replaced pool are allowed to finish.
+        Workers are started by a forkserver, forking the threaded server process
+        could copy locks held by its other threads into them.
+        With size 0 jobs run in the calling thread.
+    '''
+    def __init__(self, size, max_jobs_per_worker=None, max_worker_rss=None):
+        self.size = size
+        self.max_jobs = max_jobs_per_worker * size if max_jobs_per_worker else None
+        self.max_worker_rss = max_worker_rss
+        self._pool = None
+        self._next_pool = None
+        self._warm_ups = []
+        # Pool with a worker that grew over max_worker_rss, recycled by the next submit.
+        self._over_rss = None
+        self._jobs = 0
+        self._profiles = count()
+        self._lock = Lock()
+
+    def format(self, data, hyphenation=False, lineage=None, compression=None, style_profile=None):
+        '''
+            Formats a docx file given as bytes and returns the formatted file as bytes.
+            lineage - key from get_lineage_key, unchanged paragraphs of the previous
+            document of the lineage are not formatted again.
+            compression - name of a compression policy, the default one for None.
+            style_profile - name of a style profile, the default one for None.
+        '''
+        return self.submit(format_bytes, data, hyphenation, lineage, compression, style_profile).result()
+
+    def format_file(self, src_path, dest_path, hyphenation=False, lineage=None, compression=None, style_profile=None):
+        '''
+            Formats a docx file on disk and saves the result to dest_path.
+            Neither document passes through the calling process's memory.
+        '''
+        return self.submit(format_path, str(src_path), str(dest_path), hyphenation, lineage, compression, style_profile).result()
+
+    def format_many(self, documents, hyphenation=False, compression=None, style_profile=None, profile_name=None):
+        '''
+            Formats (key, source path, destination path) documents in parallel as format_file does,
+            so that neither document passes through the calling process's memory.
+            Yields (key, None or exception) in the order jobs finish.
+            documents are taken one at a time as jobs finish,
+            at most two jobs per worker are submitted at once.
+            profile_name - see submit, for callers that run after the profiled view returned.
+        '''
+        if not self.size:
+            for key, src_path, dest_path in documents:
+                job = self.submit(format_path, str(src_path), str(dest_path), hyphenation, None, compression, style_profile, profile_name=profile_name)
+                yield key, get_result(job)
+            return
+        jobs = {}
+        for key, src_path, dest_path in documents:
+            job = self.submit(format_path, str(src_path), str(dest_path), hyphenation, None, compression, style_profile, profile_name=profile_name)
+            jobs[job.future] = (key, job)
+            if len(jobs) >= self.size * 2:
+                yield from take_finished(jobs)
+        while jobs:
+            yield from take_finished(jobs)
+
+    def submit(self, function, *args, profile_name=None):
+        '''
+            Runs function(*args) in a worker and returns a JobFuture.
+            The job is profiled under profile_name, the current profile by default.
+        '''
+        timings = timing.current()
+        collect_timings = timings is not None
+        if profile_name is None:
+            profile_name = profiling.current()
+        if profile_name is not None:
+            profile_name = f'{profile_name}-{next(self._profiles)}'
+        if not self.size:
+            future = ImmediateFuture(run_job, function, args, collect_timings, profile_name)
+        else:
+            with self._lock:
+                pool = self.__get_pool()
+                future = pool.submit(run_job, function, args, collect_timings, profile_name)
+                self._jobs += 1
+                if self.max_jobs and self._jobs >= self.max_jobs or self._over_rss is pool:
+                    self.__recycle()
+            future.add_done_callback(lambda future: self.__check_rss(future, pool))
+        return JobFuture(future, timings)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            for pool in (self._pool, self._next_pool):
+                if pool is not None:
+                    pool.shutdown(wait=wait)
+            self._pool = None
+            self._next_pool = None
+
+    def __get_pool(self):
+        if self._pool is None:
+            self._pool, _ = self.__start_pool()
+            self._jobs = 0
+        elif self._next_pool is not None and all(warm_up.done() for warm_up in self._warm_ups):
+            self.__swap_pools()
+        return self._pool
+
+    def __start_pool(self):
+        '''
+            Returns a new pool and futures of jobs that start each of its workers.
+        '''
+        pool = ProcessPoolExecutor(
+            self.size,
+            mp_context=multiprocessing.get_context('forkserver'),
+            initializer=warm_up_worker
+        )
+        return pool, [pool.submit(os.getpid) for _ in range(self.size)]
+
+    def __swap_pools(self):
+        if any(warm_up.exception() is not None for warm_up in self._warm_ups):
+            # The replacement couldn't start, the next recycle tries again.
+            self._next_pool.shutdown(wait=False)
+        else:
+            self._pool.shutdown(wait=False)
+            self._pool = self._next_pool
+            self._jobs = 0
+        self._next_pool = None
+        self._warm_ups = []
+        self._over_rss = None
+
+    def __recycle(self):
+        if self._next_pool is None:
+            self._next_pool, self._warm_ups = self.__start_pool()
+
+    def __check_rss(self, future, pool):
+        '''
+            Runs on the pool's management thread when a job is done, so it only marks
+            the pool for the next submit to recycle instead of starting processes.
+        '''
+        if future.cancelled() or future.exception() is not None:
+            return
+        _, report = future.result()
+        if self.max_worker_rss and report['rss'] > self.max_worker_rss:
+            self._over_rss = pool
+
+
+class ImmediateFuture:
+    '''
+        Future-like result of a job run in the calling thread.
+    '''
+    def __init__(self, function, *args):
+        self._result = None
+        self._exception = None
+        try:
+            self._result = function(*args)
+        except Exception as e:
+            self._exception = e
+
+    def result(self, timeout=None):
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+
+class JobFuture:
+    '''
+        Hides the worker's reports from callers.
+        Peak RSS of the worker during the job is reported as the peak_rss fact.
+        Stages timed in the worker are added to the timings collected by the caller.
+    '''
+    def __init__(self, future, timings=None):
+        self.future = future
+        self.timings = timings
+
+    def result(self, timeout=None):
+        result, report = self.future.result(timeout)
+        if self.timings is not None and report['timings'] is not None:
+            self.timings.merge(report['timings'])
+            self.timings.add_max_facts(peak_rss=report['peak_rss'])
+            self.timings = None
+        return result
+
+
+def take_finished(jobs):
+    '''
+        Waits for at least one of the jobs, a dict future -> (key, JobFuture),
+        removes the finished ones and yields their (key, result or exception).
+    '''
+    done, _ = wait(jobs, return_when=FIRST_COMPLETED)
+    for future in done:
+        key, job = jobs.pop(future)
+        yield key, get_result(job)
+
+def get_result(future):
+    try:
+        return future.result()
+    except Exception as e:
+        return e
+
+def warm_up_worker():
+    '''
+        Imports the formatter, parses base templates and compiles style profiles
+        once when a worker starts.
+    '''
+    if not apps.ready:
+        django.setup()
+    for style_profile in STYLE_PROFILES:
+        load_template(hyphenation=False, style_profile=style_profile)
+        load_template(hyphenation=True, style_profile=style_profile)
+
+def run_job(function, args, collect_timings=False, profile_name=None):
+    '''
+        Runs a job and reports the worker's RSS, its peak during the job
+        and, optionally, timed stages along with its result.
+        With profile_name the job is profiled with cProfile and tracemalloc.
+    '''
+    if profile_name is not None:
+        with profiling.profile(profile_name):
+            return run_job(function, args, collect_timings)
+    reset_peak_rss()
+    if not collect_timings:
+        result = function(*args)
+        timings = None
+    else:
+        with timing.collect() as collected:
+            result = function(*args)
+        timings = collected.as_dict()
+    return result, {'rss': get_rss(), 'peak_rss': get_peak_rss(), 'timings': timings}
+
+def format_bytes(data, hyphenation=False, lineage=None, compression=None, style_profile=None):
+    output = BytesIO()
+    format_document(BytesIO(data), output, hyphenation, lineage, compression, style_profile)
+    return output.getvalue()
+
+def format_path(src_path, dest_path, hyphenation=False, lineage=None, compression=None, style_profile=None):
+    format_document(src_path, dest_path, hyphenation, lineage, compression, style_profile)
+
+def format_document(src, dest, hyphenation=False, lineage=None, compression=None, style_profile=None):
+    '''
+        Formats src into dest, paths or binary files.
+        Documents over STREAMING_FORMATTING_MIN_SIZE go through the streaming engine.
+    '''
+    policy = get_compression_policy(compression)
+    if should_stream(src):
+        timing.add_facts(streaming=1)
+        stream_format(src, dest, hyphenation, get_image_optimizer(), policy, style_profile)
+        return
+    formatter = prepare_and_style(src, hyphenation, lineage, style_profile)
+    with timing.stage('save'):
+        formatter.save(dest, policy)
+
+def prepare_and_style(src, hyphenation=False, lineage=None, style_profile=None):
+    '''
+        Returns a formatter with the styled copy of the document.
+        With a lineage, paragraphs are reused from and stored to the paragraph cache.
+    '''
+    paragraph_cache = get_paragraph_cache()
+    formatted_paragraphs = None
+    if lineage is not None and paragraph_cache.enabled:
+        formatted_paragraphs = paragraph_cache.load(lineage, hyphenation)
+    formatter = prepare_to_format(
+        src,
+        hyphenation=hyphenation,
+        image_optimizer=get_image_optimizer(),
+        formatted_paragraphs=formatted_paragraphs,
+        style_profile=style_profile
+    )
+    with timing.stage('style'):
+        formatter.style_document()
+    if formatted_paragraphs is not None:
+        with timing.stage('paragraph_cache'):
+            paragraph_cache.store(lineage, formatted_paragraphs, hyphenation)
+    return formatter
+
+def get_rss():
+    '''
+        Returns resident set size of the current process in bytes.
+        Falls back to peak RSS where /proc is not available.
+    '''
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def reset_peak_rss():
+    '''
+        Resets the peak RSS of the current process where the kernel allows it.
+    '''
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+    except OSError:
+        pass
+
+def get_peak_rss():
+    '''
+        Returns peak resident set size of the current process in bytes.
+    '''
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+_executor = None
+_executor_lock = Lock()
+
+
+def get_executor():
+    '''
+        Returns the process-wide formatting executor configured in settings.
+    '''
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = FormattingExecutor(
+                settings.FORMATTING_POOL_SIZE,
+                settings.FORMATTING_POOL_MAX_JOBS_PER_WORKER,
+                settings.FORMATTING_POOL_MAX_WORKER_RSS
+            )
+    return _executor
@@ -0,0 +1,144 @@
+import hashlib
+from io import BytesIO
+from threading import Lock
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from docx.oxml.ns import qn
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+EMU_PER_INCH = 914400
+OPTIMIZED_FORMATS = ('PNG', 'JPEG')
+
+
+class ImageOptimizer:
+    '''
+        Downscales images of a document to their displayed extent at target_dpi
+        and recompresses them. Images are processed in a thread pool,
+        results are cached by a hash of the image and its target size.
+        Resized images carry target_dpi, so their native size stays the displayed extent.
+    '''
+    def __init__(self, target_dpi=150, jpeg_quality=85, threads=4, cache_size=64 * 1024 * 1024):
+        if Image is None:
+            raise ImproperlyConfigured('Image optimization requires Pillow')
+        self.target_dpi = target_dpi
+        self.jpeg_quality = jpeg_quality
+        self.pool = ThreadPoolExecutor(threads)
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+        self._cached_bytes = 0
+        self._lock = Lock()
+
+    def optimize_document(self, formatter):
+        '''
+            Optimizes images referenced by body paragraphs.
+            Returns a dict rId -> optimized blob and a dict with bytes before and after.
+        '''
+        extents = get_image_extents(formatter.document.element.body)
+        jobs = [
+            (rId, formatter.get_image_blob(rId), cx, cy)
+            for rId, (cx, cy) in extents.items() if rId in formatter.rels
+        ]
+        blobs = dict(zip(
+            [rId for rId, _, _, _ in jobs],
+            self.pool.map(lambda job: self.optimize(*job[1:]), jobs)
+        ))
+        stats = {
+            'image_bytes_before': sum(len(blob) for _, blob, _, _ in jobs),
+            'image_bytes_after': sum(len(blob) for blob in blobs.values()),
+        }
+        return blobs, stats
+
+    def optimize(self, blob, cx, cy):
+        '''
+            Returns an optimized blob of an image displayed at cx x cy EMU
+            or the original blob if optimization doesn't make it smaller.
+        '''
+        width = max(1, round(cx / EMU_PER_INCH * self.target_dpi))
+        height = max(1, round(cy / EMU_PER_INCH * self.target_dpi))
+        key = (hashlib.sha1(blob).hexdigest(), width, height)
+        with self._lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return self.cache[key]
+        try:
+            optimized = self.__recompress(blob, width, height)
+        except Exception:
+            optimized = blob
+        if len(optimized) >= len(blob):
+            optimized = blob
+        self.__remember(key, optimized)
+        return optimized
+
+    def __recompress(self, blob, width, height):
+        image = Image.open(BytesIO(blob))
+        image_format = image.format
+        if image_format not in OPTIMIZED_FORMATS:
+            return blob
+        resized = image.width > width or image.height > height
+        if resized:
+            image.thumbnail((width, height), Image.LANCZOS)
+        elif image_format == 'JPEG':
+            return blob
+        output = BytesIO()
+        dpi = (self.target_dpi, self.target_dpi) if resized else image.info.get('dpi', (72, 72))
+        if image_format == 'JPEG':
+            image.save(output, 'JPEG', quality=self.jpeg_quality, optimize=True, dpi=dpi)
+        else:
+            image.save(output, 'PNG', optimize=True, dpi=dpi)
+        return output.getvalue()
+
+    def __remember(self, key, blob):
+        with self._lock:
+            if key in self.cache:
+                return
+            self.cache[key] = blob
+            self._cached_bytes += len(blob)
+            while self._cached_bytes > self.cache_size and self.cache:
+                _, evicted = self.cache.popitem(last=False)
+                self._cached_bytes -= len(evicted)
+
+
+def get_image_extents(body):
+    '''
+        Returns a dict rId -> (cx, cy) of the largest displayed extent of every image in the body.
+    '''
+    extents = {}
+    for drawing in body.iter(qn('wp:inline'), qn('wp:anchor')):
+        extent = drawing.find(qn('wp:extent'))
+        if extent is None:
+            continue
+        cx, cy = int(extent.get('cx')), int(extent.get('cy'))
+        for blip in drawing.iter(qn('a:blip')):
+            rId = blip.get(qn('r:embed'))
+            if rId is None:
+                continue
+            previous = extents.get(rId, (0, 0))
+            extents[rId] = (max(previous[0], cx), max(previous[1], cy))
+    return extents
+
+
+_image_optimizer = None
+_image_optimizer_lock = Lock()
+
+
+def get_image_optimizer():
+    '''
+        Returns the process-wide image optimizer or None if IMAGE_OPTIMIZATION is off.
+    '''
+    global _image_optimizer
+    if not settings.IMAGE_OPTIMIZATION:
+        return None
+    with _image_optimizer_lock:
+        if _image_optimizer is None:
+            _image_optimizer = ImageOptimizer(
+                settings.IMAGE_OPTIMIZATION_DPI,
+                settings.IMAGE_OPTIMIZATION_JPEG_QUALITY,
+                settings.IMAGE_OPTIMIZATION_THREADS
+            )
+    return _image_optimizer
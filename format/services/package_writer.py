@@ -0,0 +1,176 @@
+import time
+import zlib
+import struct
+from zipfile import ZipFile, ZipInfo, ZIP_DEFLATED, ZIP_STORED
+try:
+    from zipfile import sizeFileHeader, structFileHeader, _FH_FILENAME_LENGTH, _FH_EXTRA_FIELD_LENGTH
+except ImportError:
+    structFileHeader = None
+from django.conf import settings
+from docx.opc.packuri import CONTENT_TYPES_URI, PACKAGE_URI
+from docx.opc.pkgwriter import _ContentTypesItem
+
+RAW_COMPRESS_TYPES = (ZIP_STORED, ZIP_DEFLATED)
+MEDIA_MODES = ('deflate', 'store', 'auto')
+# ZipFile internals read_raw_member and write_raw_member rely on,
+# Python doesn't keep them between versions. Members are read and written
+# through the public API without them.
+RAW_COPY_ZIP_ATTRIBUTES = ('fp', '_lock', '_seekable', '_writecheck', '_didModify', 'start_dir', 'filelist', 'NameToInfo')
+# Images deflate can't make noticeably smaller.
+COMPRESSED_MEDIA_TYPES = ('image/jpeg', 'image/png', 'image/gif')
+
+
+class CompressionPolicy:
+    '''
+        How save_package compresses the parts it writes.
+        level - deflate level 0-9.
+        media - 'deflate' compresses images like other parts, 'store' stores them,
+        'auto' stores only images in COMPRESSED_MEDIA_TYPES.
+        Members copied raw keep the compression they have.
+    '''
+    def __init__(self, level=6, media='deflate'):
+        if level not in range(10):
+            raise ValueError(f'Deflate level must be 0-9, got {level}')
+        if media not in MEDIA_MODES:
+            raise ValueError(f'Media compression must be one of {", ".join(MEDIA_MODES)}, got {media}')
+        self.level = level
+        self.media = media
+
+    def get_compression(self, content_type):
+        '''
+            Returns compress_type and compresslevel for ZipFile.writestr.
+        '''
+        if content_type.startswith('image/'):
+            if self.media == 'store' or self.media == 'auto' and content_type in COMPRESSED_MEDIA_TYPES:
+                return ZIP_STORED, None
+        return ZIP_DEFLATED, self.level
+
+
+# Same as python-docx saves.
+DEFAULT_POLICY = CompressionPolicy()
+
+
+class RawMember:
+    '''
+        Compressed content of a zip member that can be written to another zip as it is.
+        CRC and file_size of the uncompressed content tell whether a part still has this content.
+    '''
+    def __init__(self, data, compress_type, CRC, file_size):
+        self.data = data
+        self.compress_type = compress_type
+        self.CRC = CRC
+        self.file_size = file_size
+
+    @classmethod
+    def compress(cls, blob):
+        compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+        data = compressor.compress(blob) + compressor.flush()
+        return cls(data, ZIP_DEFLATED, zlib.crc32(blob), len(blob))
+
+    def matches(self, blob):
+        return self.file_size == len(blob) and self.CRC == zlib.crc32(blob)
+
+    def content(self):
+        if self.compress_type == ZIP_STORED:
+            return self.data
+        return zlib.decompress(self.data, -15)
+
+
+def read_raw_member(zip_file, name):
+    '''
+        Reads a member of an open zip without decompressing it.
+        Returns None for members that can't be copied raw.
+    '''
+    if not supports_raw_copy(zip_file):
+        return None
+    zinfo = zip_file.getinfo(name)
+    if zinfo.compress_type not in RAW_COMPRESS_TYPES or zinfo.flag_bits & 0x1:
+        return None
+    # Same as ZipFile.open, which only gives access to the decompressed stream.
+    # The lock keeps other readers of the zip from moving fp in between.
+    with zip_file._lock:
+        zip_file.fp.seek(zinfo.header_offset)
+        header = struct.unpack(structFileHeader, zip_file.fp.read(sizeFileHeader))
+        zip_file.fp.seek(header[_FH_FILENAME_LENGTH] + header[_FH_EXTRA_FIELD_LENGTH], 1)
+        data = zip_file.fp.read(zinfo.compress_size)
+    return RawMember(data, zinfo.compress_type, zinfo.CRC, zinfo.file_size)
+
+def write_raw_member(zip_file, name, member):
+    '''
+        Writes compressed data of a member to a zip opened for writing,
+        or its content with writestr if the zip doesn't support raw copying.
+    '''
+    if not supports_raw_copy(zip_file):
+        zip_file.writestr(name, member.content(), member.compress_type)
+        return
+    zinfo = ZipInfo(name, time.localtime(time.time())[:6])
+    zinfo.compress_type = member.compress_type
+    zinfo.external_attr = 0o600 << 16
+    zinfo.CRC = member.CRC
+    zinfo.compress_size = len(member.data)
+    zinfo.file_size = member.file_size
+    # Same bookkeeping as ZipFile._open_to_write and _ZipWriteFile.close.
+    with zip_file._lock:
+        if zip_file._seekable:
+            zip_file.fp.seek(zip_file.start_dir)
+        zinfo.header_offset = zip_file.fp.tell()
+        zip_file._writecheck(zinfo)
+        zip_file._didModify = True
+        zip_file.fp.write(zinfo.FileHeader())
+        zip_file.fp.write(member.data)
+        zip_file.filelist.append(zinfo)
+        zip_file.NameToInfo[zinfo.filename] = zinfo
+        zip_file.start_dir = zip_file.fp.tell()
+
+def supports_raw_copy(zip_file):
+    return structFileHeader is not None and all(hasattr(zip_file, name) for name in RAW_COPY_ZIP_ATTRIBUTES)
+
+def get_raw_members(package):
+    '''
+        Returns a dict partname -> RawMember with every part of the package compressed.
+    '''
+    return {part.partname: RawMember.compress(part.blob) for part in package.parts}
+
+def save_package(package, file, raw_members, policy=DEFAULT_POLICY):
+    '''
+        Same as python-docx's package save, but parts whose content is that of
+        their raw member in raw_members are written without compressing them again.
+        Other parts are compressed as the CompressionPolicy says.
+    '''
+    with ZipFile(file, 'w', ZIP_DEFLATED, compresslevel=policy.level) as zip_file:
+        write_package(zip_file, package, raw_members, policy)
+
+def write_package(zip_file, package, raw_members, policy=DEFAULT_POLICY, written=()):
+    '''
+        Writes the package to a zip opened for writing as save_package does.
+        written - partnames of parts the caller has already written to the zip,
+        only their relationships are written.
+    '''
+    parts = list(package.parts)
+    for part in parts:
+        part.before_marshal()
+    zip_file.writestr(CONTENT_TYPES_URI.membername, _ContentTypesItem.from_parts(parts).blob)
+    zip_file.writestr(PACKAGE_URI.rels_uri.membername, package.rels.xml)
+    for part in parts:
+        if part.partname not in written:
+            member = raw_members.get(part.partname)
+            write_blob(zip_file, part.partname.membername, part.blob, part.content_type, member, policy)
+        if len(part._rels):
+            zip_file.writestr(part.partname.rels_uri.membername, part._rels.xml)
+
+def write_blob(zip_file, name, blob, content_type, member=None, policy=DEFAULT_POLICY):
+    '''
+        Writes the raw member if it has the blob's content, otherwise compresses the blob.
+    '''
+    if member is not None and member.matches(blob):
+        write_raw_member(zip_file, name, member)
+    else:
+        compress_type, compresslevel = policy.get_compression(content_type)
+        zip_file.writestr(name, blob, compress_type, compresslevel)
+
+def get_compression_policy(name=None):
+    '''
+        Returns the policy named in FORMATTING_COMPRESSION_POLICIES,
+        FORMATTING_COMPRESSION for None.
+    '''
+    return CompressionPolicy(**settings.FORMATTING_COMPRESSION_POLICIES[name or settings.FORMATTING_COMPRESSION])
@@ -0,0 +1,151 @@
+import os
+import json
+import hashlib
+from tempfile import NamedTemporaryFile
+from django.conf import settings
+from docx.oxml import parse_xml
+from docx.oxml.ns import qn
+from lxml import etree
+from .result_cache import new_key
+from .templates import get_template_path
+
+W_P = qn('w:p')
+W_TBL = qn('w:tbl')
+
+
+def get_lineage_key(owner, upload_name, hyphenation=False):
+    '''
+        Returns a key of the documents one owner uploads under one name.
+        owner - e.g. user id or session key.
+    '''
+    key = new_key(hyphenation, 'incremental')
+    key.update(f'{owner}:{upload_name}'.encode())
+    return key.hexdigest()
+
+def get_paragraph_key(element, role):
+    '''
+        Returns a hash of a source w:p or w:tbl element and its role in the document,
+        e.g. whether it starts a chapter and what list it belongs to.
+    '''
+    key = hashlib.sha1(role.encode())
+    key.update(etree.tostring(element))
+    return key.hexdigest()
+
+
+class FormattedParagraphs:
+    '''
+        Formatted w:p elements of a document grouped by the key of the source paragraph
+        they were made from. Groups of the previous document of the lineage
+        are reused for source paragraphs with the same key.
+    '''
+    def __init__(self, previous=None):
+        self.previous = previous or {}
+        self.groups = {}
+        self.fresh = set()
+        self.reused = 0
+
+    def reuse(self, key):
+        '''
+            Returns new copies of the formatted elements of the key or None.
+        '''
+        group = self.previous.get(key)
+        if group is None:
+            return None
+        self.groups[key] = group
+        self.reused += 1
+        return [parse_xml(xml) for xml in group]
+
+    def add(self, key, elements):
+        '''
+            Records elements made from a source paragraph or table, they still have to be styled.
+            Elements without a key are not reused by the next document.
+        '''
+        self.fresh.update(elements)
+        for element in elements:
+            if element.tag == W_TBL:
+                self.fresh.update(element.iter(W_P))
+        if key is not None:
+            self.groups[key] = elements
+
+    def as_dict(self):
+        return {
+            key: [xml if isinstance(xml, str) else etree.tostring(xml, encoding='unicode') for xml in group]
+            for key, group in self.groups.items()
+        }
+
+
+class ParagraphCache:
+    '''
+        Formatted paragraphs of the last document of every lineage, one JSON file per lineage.
+        Least recently used lineages are removed when there are more than max_lineages.
+        Several processes can share one directory.
+    '''
+    def __init__(self, directory, max_lineages):
+        self.directory = directory
+        self.max_lineages = max_lineages
+
+    @property
+    def enabled(self):
+        return self.max_lineages > 0
+
+    def load(self, lineage, hyphenation=False):
+        '''
+            Returns FormattedParagraphs with the previous document of the lineage, if any.
+            Paragraphs formatted with another template are not reused.
+        '''
+        try:
+            with open(self.__get_path(lineage)) as file:
+                stored = json.load(file)
+        except (OSError, ValueError):
+            return FormattedParagraphs()
+        if stored.get('template') != get_template_version(hyphenation):
+            return FormattedParagraphs()
+        return FormattedParagraphs(stored['paragraphs'])
+
+    def store(self, lineage, formatted_paragraphs, hyphenation=False):
+        if not self.enabled:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with NamedTemporaryFile('w', dir=self.directory, suffix='.tmp', delete=False) as file:
+            json.dump({
+                'template': get_template_version(hyphenation),
+                'paragraphs': formatted_paragraphs.as_dict(),
+            }, file)
+        os.replace(file.name, self.__get_path(lineage))
+        self.evict()
+
+    def evict(self):
+        '''
+            Removes least recently stored lineages over max_lineages.
+        '''
+        entries = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith('.json'):
+                continue
+            try:
+                entries.append((entry.stat().st_mtime, entry.path))
+            except FileNotFoundError:
+                continue
+        entries.sort(reverse=True)
+        for _, path in entries[self.max_lineages:]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def __get_path(self, lineage):
+        return self.directory / f'{lineage}.json'
+
+
+def get_template_version(hyphenation):
+    return get_template_path(hyphenation).stat().st_mtime_ns
+
+
+_paragraph_cache = None
+
+
+def get_paragraph_cache():
+    global _paragraph_cache
+    if _paragraph_cache is None:
+        _paragraph_cache = ParagraphCache(settings.INCREMENTAL_FORMATTING_DIR, settings.INCREMENTAL_FORMATTING_MAX_LINEAGES)
+    return _paragraph_cache
@@ -0,0 +1,206 @@
+from copy import deepcopy
+from docx.oxml.ns import qn
+from docx.oxml.xmlchemy import OxmlElement
+from docx.shared import RGBColor
+
+# Run children that are safe to move to another package.
+# Drawings, objects, footnote and comment references point to parts
+# of the source package and are not copied, clone_table copies drawings
+# it is given a copy_drawing for.
+RUN_CONTENT = frozenset(qn(tag) for tag in (
+    'w:rPr',
+    'w:t',
+    'w:tab',
+    'w:ptab',
+    'w:br',
+    'w:cr',
+    'w:sym',
+    'w:noBreakHyphen',
+    'w:softHyphen',
+    'w:fldChar',
+    'w:instrText',
+    'w:lastRenderedPageBreak',
+))
+
+# Run properties that are replaced by the formatter's styles.
+NORMALISED_RUN_PROPERTIES = frozenset(qn(tag) for tag in (
+    'w:rStyle',
+    'w:rFonts',
+    'w:sz',
+    'w:szCs',
+))
+
+# Table cell children that are copied, the rest may point to parts of the source package.
+CELL_CONTENT = frozenset(qn(tag) for tag in (
+    'w:tcPr',
+    'w:p',
+    'w:tbl',
+))
+
+# Cell paragraph properties that are copied, the rest come from the formatter's styles.
+CELL_PARAGRAPH_PROPERTIES = frozenset(qn(tag) for tag in (
+    'w:numPr',
+    'w:jc',
+))
+
+# Run properties that follow w:color in the schema.
+COLOR_SUCCESSORS = frozenset(qn(tag) for tag in (
+    'w:spacing',
+    'w:w',
+    'w:kern',
+    'w:position',
+    'w:sz',
+    'w:szCs',
+    'w:highlight',
+    'w:u',
+    'w:effect',
+    'w:bdr',
+    'w:shd',
+    'w:fitText',
+    'w:vertAlign',
+    'w:rtl',
+    'w:cs',
+    'w:em',
+    'w:lang',
+    'w:eastAsianLayout',
+    'w:specVanish',
+    'w:oMath',
+))
+
+BLACK = str(RGBColor(0, 0, 0))
+
+W_P = qn('w:p')
+W_R = qn('w:r')
+W_TC = qn('w:tc')
+W_HYPERLINK = qn('w:hyperlink')
+W_DRAWING = qn('w:drawing')
+W_PPR = qn('w:pPr')
+W_NUMPR = qn('w:numPr')
+W_NUMID = qn('w:numId')
+W_RPR = qn('w:rPr')
+W_COLOR = qn('w:color')
+W_VAL = qn('w:val')
+W_BR = qn('w:br')
+W_TYPE = qn('w:type')
+W_CLEAR = qn('w:clear')
+
+
+def clone_runs(src_paragraph, dest_paragraph):
+    '''
+        Copies runs of src_paragraph to dest_paragraph by cloning their xml.
+        Keeps all run formatting except properties set by the formatter's styles.
+    '''
+    dest_p = dest_paragraph._p
+    for r in src_paragraph._p.iterchildren(W_R):
+        dest_p.append(clone_run(r))
+
+def clone_run(r):
+    return normalise_run(deepcopy(r))
+
+def normalise_run(run, copy_drawing=None):
+    '''
+        Removes content and properties of a run that clone_run doesn't copy, in place.
+        copy_drawing - function of a w:drawing returning its copy or None, see clone_table.
+    '''
+    for child in list(run):
+        if child.tag == W_DRAWING and copy_drawing is not None:
+            drawing = copy_drawing(child)
+            if drawing is not None:
+                child.addprevious(drawing)
+            run.remove(child)
+        elif child.tag not in RUN_CONTENT:
+            run.remove(child)
+        elif child.tag == W_RPR:
+            normalise_run_properties(run, child)
+        elif child.tag == W_BR:
+            # Page and column breaks become line breaks,
+            # the formatter adds its own page breaks before headers.
+            child.attrib.pop(W_TYPE, None)
+            child.attrib.pop(W_CLEAR, None)
+    return run
+
+def normalise_run_properties(run, rPr):
+    for property in list(rPr):
+        if property.tag in NORMALISED_RUN_PROPERTIES:
+            rPr.remove(property)
+    if len(rPr) == 0:
+        run.remove(rPr)
+
+def clone_table(tbl, copy_drawing=None, get_list_num_id=None):
+    '''
+        Copies a table keeping its rows, cells and their properties.
+        Hyperlinks in cells are replaced with their content, cell paragraphs keep
+        their alignment, numbering and runs, normalised and black like body paragraphs.
+        copy_drawing - function of a w:drawing in a cell returning its copy for the destination
+        package or None, drawings are dropped without it.
+        get_list_num_id - function of a cell w:p with w:numPr returning the numId of the
+        destination's numbering it gets or None, numbering is dropped without it.
+        Works on the copied tree as a whole instead of going cell by cell.
+    '''
+    table = deepcopy(tbl)
+    for link in list(table.iter(W_HYPERLINK)):
+        for element in list(link):
+            link.addprevious(element)
+        link.getparent().remove(link)
+    for tc in table.iter(W_TC):
+        has_paragraph = False
+        for child in list(tc):
+            if child.tag not in CELL_CONTENT:
+                tc.remove(child)
+            elif child.tag == W_P:
+                has_paragraph = True
+        if not has_paragraph:
+            tc.append(OxmlElement('w:p'))
+    for p in table.iter(W_P):
+        pPr = p.find(W_PPR)
+        if pPr is not None:
+            normalise_cell_paragraph_properties(p, pPr, get_list_num_id)
+        runs = list(p.iterchildren(W_R))
+        p.clear()
+        if pPr is not None and len(pPr):
+            p.append(pPr)
+        for run in runs:
+            p.append(normalise_run(run, copy_drawing))
+            set_black(run)
+    return table
+
+def normalise_cell_paragraph_properties(p, pPr, get_list_num_id=None):
+    '''
+        Removes properties of a cell paragraph that clone_table doesn't copy, in place.
+        Numbering is moved to the numId get_list_num_id returns, keeping the list level.
+    '''
+    for property in list(pPr):
+        if property.tag not in CELL_PARAGRAPH_PROPERTIES:
+            pPr.remove(property)
+        elif property.tag == W_NUMPR:
+            num_id = get_list_num_id(p) if get_list_num_id is not None else None
+            if num_id is None:
+                pPr.remove(property)
+                continue
+            numId = property.find(W_NUMID)
+            if numId is None:
+                numId = property.makeelement(W_NUMID)
+                property.append(numId)
+            numId.set(W_VAL, str(num_id))
+
+def set_black(run):
+    '''
+        Same as setting run.font.color.rgb to black with python-docx,
+        without its lookups of the schema order. w:rPr is the first child of w:r.
+    '''
+    if len(run) and run[0].tag == W_RPR:
+        rPr = run[0]
+    else:
+        rPr = run.makeelement(W_RPR)
+        run.insert(0, rPr)
+    successor = None
+    for child in list(rPr):
+        if child.tag == W_COLOR:
+            rPr.remove(child)
+        elif successor is None and child.tag in COLOR_SUCCESSORS:
+            successor = child
+    color = rPr.makeelement(W_COLOR, {W_VAL: BLACK})
+    if successor is None:
+        rPr.append(color)
+    else:
+        successor.addprevious(color)
@@ -0,0 +1,145 @@
+from docx.enum.style import WD_STYLE_TYPE
+from docx.oxml.ns import qn
+
+
+class ParagraphKind:
+    HEADER = 'header'
+    SECONDARY_HEADER = 'secondary_header'
+    BULLET_LIST = 'bullet_list'
+    NUMBER_LIST = 'number_list'
+    IMAGE = 'image'
+    IMAGE_CAPTION = 'image_caption'
+    TEXT = 'text'
+    # Paragraphs in cells of body tables, nested tables included.
+    TABLE_TEXT = 'table_text'
+
+
+STYLED_KINDS = (
+    ParagraphKind.HEADER,
+    ParagraphKind.BULLET_LIST,
+    ParagraphKind.NUMBER_LIST,
+    ParagraphKind.IMAGE,
+    ParagraphKind.IMAGE_CAPTION,
+)
+
+OFF_VALUES = ('0', 'false', 'off')
+
+
+class ParagraphIndex:
+    '''
+        Classifies all body paragraphs of a document in one pass.
+        Keeps lists of w:p elements for every paragraph kind.
+        Paragraphs of tables are only collected, they are never headers, lists or captions.
+    '''
+    def __init__(self, document):
+        self.body = document.element.body
+        self.body_length = len(self.body)
+        self.number_list_style_id = find_style_id(document, 'List Number')
+        self.bullet_list_style_id = find_style_id(document, 'List Bullet')
+        self.paragraphs = list(self.body.iterchildren(qn('w:p')))
+        self.kinds = {}
+        self.__classify()
+
+    def is_stale(self):
+        '''
+            Returns True if paragraphs were added to or removed from the body
+            bypassing the formatter.
+        '''
+        return len(self.body) != self.body_length
+
+    def get(self, kind):
+        return self.kinds[kind]
+
+    def __classify(self):
+        kinds = {kind: [] for kind in STYLED_KINDS}
+        kinds[ParagraphKind.SECONDARY_HEADER] = []
+        kinds[ParagraphKind.TEXT] = []
+        classifier = ParagraphClassifier(self.number_list_style_id, self.bullet_list_style_id)
+        for p in self.paragraphs:
+            for kind in classifier.classify(p):
+                kinds[kind].append(p)
+        kinds[ParagraphKind.TABLE_TEXT] = self.body.xpath('./w:tbl//w:p')
+        self.kinds = kinds
+
+
+class ParagraphClassifier:
+    '''
+        Classifies body paragraphs one at a time in document order,
+        looking back at the previous paragraph only.
+        A paragraph is a header if it is the first one or follows a page break,
+        a caption if it follows an image.
+    '''
+    def __init__(self, number_list_style_id, bullet_list_style_id):
+        self.number_list_style_id = number_list_style_id
+        self.bullet_list_style_id = bullet_list_style_id
+        self.count = 0
+        self.page_break = False
+        self.image_found = False
+
+    def classify(self, p):
+        '''
+            Returns the kinds of the next w:p element of the body.
+        '''
+        kinds = []
+        if self.count == 0 or self.page_break:
+            kinds.append(ParagraphKind.HEADER)
+        self.page_break = False
+        if self.count > 0:
+            self.page_break, bold = scan_runs(p)
+            if bold:
+                kinds.append(ParagraphKind.SECONDARY_HEADER)
+        self.count += 1
+
+        style_id = p.style
+        if style_id == self.number_list_style_id:
+            kinds.append(ParagraphKind.NUMBER_LIST)
+        elif style_id == self.bullet_list_style_id:
+            kinds.append(ParagraphKind.BULLET_LIST)
+
+        if self.image_found:
+            kinds.append(ParagraphKind.IMAGE_CAPTION)
+        self.image_found = next(p.iter(qn('a:graphicData')), None) is not None
+        if self.image_found:
+            kinds.append(ParagraphKind.IMAGE)
+
+        if not any(kind in STYLED_KINDS for kind in kinds):
+            kinds.append(ParagraphKind.TEXT)
+        return kinds
+
+
+def find_style_id(document, style_name):
+    '''
+        Returns id of a paragraph style or an empty string
+        if the document doesn't have it. Paragraphs never have an empty style id.
+    '''
+    try:
+        style = document.styles[style_name]
+    except KeyError:
+        return ''
+    if style.type != WD_STYLE_TYPE.PARAGRAPH:
+        return ''
+    return style.style_id
+
+def scan_runs(p):
+    '''
+        Returns a pair (has page break, starts with bold run).
+        Runs are scanned until the first page break or non-bold run.
+    '''
+    bold = False
+    for r in p.iterchildren(qn('w:r')):
+        for br in r.iterchildren(qn('w:br')):
+            if br.get(qn('w:type')) == 'page':
+                return True, bold
+        if not is_bold(r):
+            break
+        bold = True
+    return False, bold
+
+def is_bold(r):
+    rPr = r.find(qn('w:rPr'))
+    if rPr is None:
+        return False
+    b = rPr.find(qn('w:b'))
+    if b is None:
+        return False
+    return b.get(qn('w:val')) not in OFF_VALUES
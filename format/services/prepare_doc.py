@@ -1,55 +1,274 @@
-from django.conf import settings
 from .doc_formatter import DocumentFormatter
 from docx.oxml.xmlchemy import OxmlElement
+from io import BytesIO
+from functools import partial
+from .templates import load_template
 from .ImageExtractor import ImageExtractor
+from .paragraph_copy import clone_runs, clone_table
+from .paragraph_cache import get_paragraph_key
+from . import timing
 from docx.oxml.ns import qn
-from docx.enum.style import WD_BUILTIN_STYLE
+from docx.enum.style import WD_BUILTIN_STYLE, WD_STYLE_TYPE
+from docx.text.paragraph import Paragraph
+from docx.shared import Emu
 
 w = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+W_P = qn('w:p')
+W_TBL = qn('w:tbl')
+W_DRAWING = qn('w:drawing')
+W_PICT = qn('w:pict')
 
-def prepare_to_format(path_to_document, hyphenation=False):
+def prepare_to_format(path_to_document, hyphenation=False, copy_engine='xml', image_optimizer=None, formatted_paragraphs=None, style_profile=None):
     '''
         Copies content from original document and makes a formatter from the copy.
+        Body tables are copied with clone_table whatever the copy_engine,
+        pictures in their cells keep the size they have in the source.
         Returns a formatter with document ready to be formatted.
+        copy_engine - 'xml' clones runs with lxml, 'docx' rebuilds them with python-docx.
+        image_optimizer - ImageOptimizer, images are copied as they are without it.
+        Source images are decompressed only when a copied paragraph references them,
+        the source archive is closed before returning.
+        formatted_paragraphs - FormattedParagraphs of the previous document of the lineage,
+        unchanged paragraphs are taken from it already styled and only the rest is copied
+        and left for style_document.
+        style_profile - name of the style profile the standard styles are taken from,
+        the default one for None. Reused paragraphs only refer to the styles by id,
+        so they don't depend on the profile.
     '''
-    
-    ImageExtractor(path_to_document).extract_images()
-    formatter = DocumentFormatter(path_to_document)
-    formatter.remove_hyperlinks()
-    headers, _ = formatter.get_headers()
-    headers_text = list(map(lambda x: x.text, headers))
-    if hyphenation:
-        new_formatter = DocumentFormatter(settings.BASE_DIR / 'format/services/base-hyphen.docx')
-    else:
-        new_formatter = DocumentFormatter(settings.BASE_DIR / 'format/services/base.docx')
-    new_formatter.document._body.clear_content()
-    for p in formatter.document.paragraphs:
-        if p.text in headers_text and p.text != headers_text[0]:
-            paragraph = new_formatter.document.add_paragraph(p.text)
-            new_formatter.add_page_break_before_paragraph(paragraph)
-        else:
-            numPr = p._p.get_or_add_pPr().numPr
-            if numPr is not None:
-                list_type = get_list_type_by_paragraph(formatter, p)     
-                if list_type == 'bullet':
-                    list_style = new_formatter.document.styles['List Bullet']
+    copy = COPY_ENGINES[copy_engine]
+    with ImageExtractor(path_to_document) as source_images:
+        with timing.stage('open'):
+            formatter = DocumentFormatter(source_images.open_document(), source_images)
+        with timing.stage('hyperlinks'):
+            timing.add_facts(**formatter.remove_hyperlinks())
+        with timing.stage('classify'):
+            headers, _ = formatter.get_headers()
+            headers_text = list(map(lambda x: x.text, headers))
+        with timing.stage('template'):
+            new_formatter = load_template(hyphenation, style_profile)
+        numbering_map = get_numbering_map(formatter.get_numbering_object())
+        image_blobs = None
+        if image_optimizer is not None:
+            with timing.stage('optimize_images'):
+                image_blobs, image_stats = image_optimizer.optimize_document(formatter)
+            timing.add_facts(**image_stats)
+        source_body = formatter.document._body
+        paragraphs = []
+        list_items = 0
+        images = 0
+        tables = 0
+        body = new_formatter.document.element.body
+        end = body.sectPr
+        styles = new_formatter.document.styles
+        bullet_style_id = new_formatter.document.part.get_style_id(styles['List Bullet'], WD_STYLE_TYPE.PARAGRAPH)
+        number_style_id = new_formatter.document.part.get_style_id(styles['List Number'], WD_STYLE_TYPE.PARAGRAPH)
+        copy_cell_drawing = partial(copy_drawing, formatter, new_formatter, image_blobs=image_blobs)
+        get_cell_list_num_id = partial(
+            get_list_num_id,
+            formatter,
+            numbering_map=numbering_map,
+            bullet_num_id=get_style_num_id(styles['List Bullet']),
+            number_num_id=get_style_num_id(styles['List Number'])
+        )
+        dropped_drawings = 0
+        last = None
+        after_image = False
+        with timing.stage('copy'):
+            for element in formatter.document.element.body.iterchildren(W_P, W_TBL):
+                key = None
+                if element.tag == W_TBL:
+                    # Pictures in reused cells would refer to parts of the previous document's package.
+                    if formatted_paragraphs is not None and not has_drawing(element):
+                        key = get_paragraph_key(element, 'table')
+                        reused = insert_reused(formatted_paragraphs, key, body, end)
+                        if reused is not None:
+                            last = reused[-1] if reused else last
+                            continue
+                    tables += 1
+                    table = clone_table(element, copy_cell_drawing, get_cell_list_num_id)
+                    insert_paragraph(body, end, table)
+                    cell_images = count_drawings(table)
+                    images += cell_images
+                    dropped_drawings += count_drawings(element) - cell_images
                 else:
-                    list_style = new_formatter.document.styles['List Number']
-                copied_list = new_formatter.document.add_paragraph(style=list_style)
-                copy_runs(p, copied_list)
-            elif '<a:graphicData' in p._p.xml:
-                print('i')
-                copy_images(formatter, new_formatter, p)
-            else:
-                copied_paragraph = new_formatter.document.add_paragraph()
-                copy_runs(p, copied_paragraph)
-    return new_formatter
-
-def copy_images(src_formatter, dest_formatter, paragraph):
+                    p = Paragraph(element, source_body)
+                    paragraphs.append(p)
+                    if formatted_paragraphs is not None:
+                        has_image = has_graphic(p)
+                        # Images, their captions and the first paragraph depend on their neighbours.
+                        # Tables before the first paragraph don't change that it is the first one.
+                        if len(paragraphs) > 1 and not has_image and not after_image:
+                            key = get_paragraph_key(element, get_paragraph_role(formatter, p, headers_text, numbering_map))
+                            reused = insert_reused(formatted_paragraphs, key, body, end)
+                            if reused is not None:
+                                last = reused[-1] if reused else last
+                                continue
+                        after_image = has_image
+                    if p.text in headers_text and p.text != headers_text[0]:
+                        paragraph = add_paragraph(new_formatter, end, p.text)
+                        new_formatter.add_page_break_before_paragraph(paragraph)
+                    else:
+                        numPr = p._p.get_or_add_pPr().numPr
+                        if numPr is not None:
+                            list_items += 1
+                            list_type = get_list_type_by_paragraph(formatter, p, numbering_map)
+                            if list_type == 'bullet':
+                                list_style_id = bullet_style_id
+                            else:
+                                list_style_id = number_style_id
+                            copied_list = add_paragraph(new_formatter, end, style_id=list_style_id)
+                            copy(p, copied_list)
+                        elif has_graphic(p):
+                            with timing.stage('images'):
+                                images += copy_images(formatter, new_formatter, p, image_blobs)
+                        else:
+                            copied_paragraph = add_paragraph(new_formatter, end)
+                            copy(p, copied_paragraph)
+                if formatted_paragraphs is not None:
+                    added = get_added_paragraphs(body, last)
+                    formatted_paragraphs.add(key, added)
+                    last = added[-1] if added else last
+        if formatted_paragraphs is not None:
+            new_formatter.styled_paragraphs = formatted_paragraphs.fresh
+            timing.add_facts(reused_paragraphs=formatted_paragraphs.reused)
+        if timing.is_collecting():
+            timing.add_facts(
+                paragraphs=len(paragraphs),
+                runs=sum(len(p._p.r_lst) for p in paragraphs),
+                list_items=list_items,
+                images=images,
+                tables=tables,
+                dropped_drawings=dropped_drawings
+            )
+        return new_formatter
+
+def copy_images(src_formatter, dest_formatter, paragraph, image_blobs=None):
+    '''
+        Copies images of the paragraph straight from the source package blobs,
+        read on demand when the source was opened lazily.
+        image_blobs - dict rId -> blob replacing source blobs, e.g. optimized images.
+        Destination package keeps one image part per sha1 of the blob.
+        Images copied as they are keep their compressed source data for the destination's save.
+        Returns the number of copied images.
+    '''
     rels = src_formatter.rels
-    for rId in rels:
-        if rId in paragraph._p.xml:
-            dest_formatter.document.add_picture(f'{settings.MEDIA_ROOT}/images/{rels[rId]}')
+    copied = 0
+    for rId in get_image_rIds(paragraph):
+        if rId in rels:
+            blob, raw = read_image(src_formatter, rId, image_blobs)
+            inline_shape = dest_formatter.document.add_picture(BytesIO(blob))
+            keep_raw_image(dest_formatter, inline_shape._inline, raw)
+            copied += 1
+    return copied
+
+def copy_drawing(src_formatter, dest_formatter, drawing, image_blobs=None):
+    '''
+        Returns a w:drawing of the destination with the picture of a source w:drawing
+        at its size in the source, or None if the drawing isn't a picture of the source package.
+    '''
+    picture = get_drawing_picture(drawing)
+    if picture is None or picture[0] not in src_formatter.rels:
+        return None
+    rId, cx, cy = picture
+    blob, raw = read_image(src_formatter, rId, image_blobs)
+    inline = dest_formatter.document.part.new_pic_inline(BytesIO(blob), Emu(cx), Emu(cy))
+    keep_raw_image(dest_formatter, inline, raw)
+    copied = OxmlElement('w:drawing')
+    copied.append(inline)
+    return copied
+
+def read_image(src_formatter, rId, image_blobs=None):
+    '''
+        Returns the blob of a source image and its RawMember,
+        None if image_blobs replaces it or it can't be copied raw.
+    '''
+    if image_blobs is not None and rId in image_blobs:
+        return image_blobs[rId], None
+    raw = src_formatter.get_raw_image(rId)
+    blob = raw.content() if raw is not None else src_formatter.get_image_blob(rId)
+    return blob, raw
+
+def keep_raw_image(dest_formatter, inline, raw):
+    '''
+        Lets the destination's save write an image copied as it is with its compressed source data.
+    '''
+    if raw is not None and dest_formatter.raw_members is not None:
+        dest_rId = inline.xpath('.//a:blip/@r:embed')[0]
+        dest_formatter.raw_members[dest_formatter.document.part.related_parts[dest_rId].partname] = raw
+
+def add_paragraph(formatter, end, text=None, style_id=None):
+    '''
+        Same as Document.add_paragraph, but inserts the paragraph right before end,
+        the w:sectPr of the body, instead of looking it up among all body children.
+    '''
+    p = OxmlElement('w:p')
+    if style_id is not None:
+        p.style = style_id
+    insert_paragraph(formatter.document.element.body, end, p)
+    paragraph = Paragraph(p, formatter.document._body)
+    if text:
+        paragraph.add_run(text)
+    return paragraph
+
+def insert_paragraph(body, end, p):
+    if end is None:
+        body.append(p)
+    else:
+        end.addprevious(p)
+
+def insert_reused(formatted_paragraphs, key, body, end):
+    '''
+        Inserts the formatted elements the previous document made from the key.
+        Returns them or None if the previous document doesn't have the key.
+    '''
+    reused = formatted_paragraphs.reuse(key)
+    if reused is not None:
+        for element in reused:
+            insert_paragraph(body, end, element)
+    return reused
+
+def get_paragraph_role(formatter, paragraph, headers_text, numbering_map):
+    if paragraph.text in headers_text and paragraph.text != headers_text[0]:
+        return 'header'
+    if paragraph._p.get_or_add_pPr().numPr is not None:
+        return f'list:{get_list_type_by_paragraph(formatter, paragraph, numbering_map)}'
+    return 'text'
+
+def get_added_paragraphs(body, last):
+    '''
+        Returns w:p and w:tbl elements following last in the body,
+        from the start of the body if last is None.
+    '''
+    added = []
+    element = body[0] if last is None else last.getnext()
+    while element is not None and element.tag in (W_P, W_TBL):
+        added.append(element)
+        element = element.getnext()
+    return added
+
+def has_graphic(paragraph):
+    return next(paragraph._p.iter(qn('a:graphicData')), None) is not None
+
+def get_image_rIds(paragraph):
+    return paragraph._p.xpath('.//a:graphicData//a:blip/@r:embed')
+
+def get_drawing_picture(drawing):
+    '''
+        Returns (rId, cx, cy) of the picture a w:drawing shows and its size in EMU,
+        None if it doesn't show a picture.
+    '''
+    for shape in drawing.iterchildren(qn('wp:inline'), qn('wp:anchor')):
+        extent = shape.find(qn('wp:extent'))
+        blip = next(shape.iter(qn('a:blip')), None)
+        if extent is not None and blip is not None and blip.get(qn('r:embed')) is not None:
+            return blip.get(qn('r:embed')), int(extent.get('cx')), int(extent.get('cy'))
+    return None
+
+def has_drawing(element):
+    return next(element.iter(W_DRAWING, W_PICT), None) is not None
+
+def count_drawings(element):
+    return sum(1 for _ in element.iter(W_DRAWING))
 
 def copy_runs(src_paragraph, dest_paragraph):
     for run in src_paragraph.runs:
@@ -59,49 +278,87 @@ def copy_runs(src_paragraph, dest_paragraph):
         copied_run.font.underline = run.font.underline
         copied_run.font.color.rgb = run.font.color.rgb
 
-def get_list_type_by_paragraph(formatter, paragraph):
+COPY_ENGINES = {
+    'xml': clone_runs,
+    'docx': copy_runs,
+}
+
+def get_list_type_by_paragraph(formatter, paragraph, numbering_map=None):
+    '''
+        Returns numFmt of the paragraph's list level or None if it can't be resolved.
+        Pass numbering_map from get_numbering_map when resolving many paragraphs.
+    '''
+    if numbering_map is None:
+        numbering_map = get_numbering_map(formatter.get_numbering_object())
     numPr = paragraph._p.get_or_add_pPr().numPr
+    if numPr.numId is None:
+        return None
     numId = numPr.numId.val
-    ilvl = numPr.ilvl.val
-    numbering_object = formatter.get_numbering_object()
-    num_object = get_num_object_by_id(numbering_object, numId)
-    abstract_num_id = get_abstract_num_id_from_num_object(num_object)
-    abstract_num_object = get_abstract_num_object_by_id(numbering_object, abstract_num_id)
-    levels = get_levels_from_abstract_num_object(abstract_num_object)
-    level = get_level_by_ilvl(levels, ilvl)
-    list_type = get_list_type_from_level(level)
-    return(list_type)
-
-def get_num_object_by_id(numbering_object, numId):
-    num_object = list(filter(
-        lambda x: int(x.values()[0]) == numId, numbering_object.xpath('w:num')
-    ))[0]
-    return num_object
+    ilvl = numPr.ilvl.val if numPr.ilvl is not None else 0
+    level = numbering_map.get((numId, ilvl))
+    if level is None:
+        return None
+    return level['format']
+
+def get_list_num_id(formatter, p, numbering_map=None, bullet_num_id=None, number_num_id=None):
+    '''
+        Returns the destination's numId for a source w:p with w:numPr,
+        that of the bullet or the number list style as its list type says.
+    '''
+    list_type = get_list_type_by_paragraph(formatter, Paragraph(p, None), numbering_map)
+    return bullet_num_id if list_type == 'bullet' else number_num_id
+
+def get_style_num_id(style):
+    '''
+        Returns numId of the numbering a paragraph style applies or None.
+    '''
+    pPr = style.element.pPr
+    if pPr is None or pPr.numPr is None or pPr.numPr.numId is None:
+        return None
+    return pPr.numPr.numId.val
+
+def get_numbering_map(numbering_object):
+    '''
+        Resolves every num and level of the numbering part in one pass.
+        Returns dict (numId, ilvl) -> {'format', 'restart', 'start'},
+        empty for None, a document without numbering.
+    '''
+    if numbering_object is None:
+        return {}
+    abstract_levels = {}
+    for abstract_num_object in numbering_object.iterchildren(f'{{{w}}}abstractNum'):
+        abstract_num_id = abstract_num_object.get(f'{{{w}}}abstractNumId')
+        abstract_levels[abstract_num_id] = {
+            int(level.get(f'{{{w}}}ilvl')): get_level_properties(level)
+            for level in abstract_num_object.iterchildren(f'{{{w}}}lvl')
+        }
+
+    numbering_map = {}
+    for num_object in numbering_object.iterchildren(f'{{{w}}}num'):
+        numId = int(num_object.get(f'{{{w}}}numId'))
+        abstract_num_id = get_abstract_num_id_from_num_object(num_object)
+        for ilvl, properties in abstract_levels.get(abstract_num_id, {}).items():
+            numbering_map[(numId, ilvl)] = dict(properties)
+        for override in num_object.iterchildren(f'{{{w}}}lvlOverride'):
+            ilvl = int(override.get(f'{{{w}}}ilvl'))
+            level = override.find(f'{{{w}}}lvl')
+            if level is not None:
+                numbering_map[(numId, ilvl)] = get_level_properties(level)
+            start_override = override.find(f'{{{w}}}startOverride')
+            if start_override is not None and (numId, ilvl) in numbering_map:
+                numbering_map[(numId, ilvl)]['start'] = int(start_override.get(f'{{{w}}}val'))
+    return numbering_map
+
+def get_level_properties(level):
+    number_format = level.find(f'{{{w}}}numFmt')
+    restart = level.find(f'{{{w}}}lvlRestart')
+    start = level.find(f'{{{w}}}start')
+    return {
+        'format': number_format.get(f'{{{w}}}val') if number_format is not None else None,
+        'restart': int(restart.get(f'{{{w}}}val')) if restart is not None else None,
+        'start': int(start.get(f'{{{w}}}val')) if start is not None else None,
+    }
 
 def get_abstract_num_id_from_num_object(num_object):
     abstract_num_id = num_object.xpath('w:abstractNumId')[0].get(f'{{{w}}}val')
     return abstract_num_id
-
-def get_abstract_num_object_by_id(numbering_object, abstract_num_id):
-    abstract_num_object = list(filter(
-        lambda x: abstract_num_id == x.get(f'{{{w}}}abstractNumId'), numbering_object.xpath('w:abstractNum')
-    ))[0]
-    return abstract_num_object
-
-def get_levels_from_abstract_num_object(abstract_num_object):
-    levels = abstract_num_object.xpath('w:lvl', namespaces={'w': w})
-    return levels
-
-def get_level_by_ilvl(levels, ilvl):
-    level = list(filter(
-        lambda x: int(x.get(f'{{{w}}}ilvl')) == ilvl, levels
-    ))[0]
-    return level
-
-def get_list_type_from_level(level):
-    list_type = level.xpath('w:numFmt', namespaces={'w': w})[0].get(f'{{{w}}}val')
-    return list_type
-
-def get_level_restart(level):
-    level_restart = level.xpath('w:lvlRestart', namespaces={'w': w})
-    return level_restart
\ No newline at end of file
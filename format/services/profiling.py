@@ -0,0 +1,105 @@
+import os
+import time
+import random
+import cProfile
+import tracemalloc
+from uuid import uuid4
+from functools import wraps
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+
+TOP_ALLOCATIONS = 25
+
+_current = ContextVar('profile_name', default=None)
+
+
+def current():
+    '''
+        Returns the name of the profile requested for the current request or None.
+    '''
+    return _current.get()
+
+def should_profile(request, route):
+    '''
+        Staff can profile a request by sending a profile parameter,
+        other requests are sampled at FORMATTING_PROFILE_SAMPLING rate of the route.
+    '''
+    if request.user.is_staff and (request.GET.get('profile') or request.POST.get('profile')):
+        return True
+    rate = settings.FORMATTING_PROFILE_SAMPLING.get(route, 0)
+    return rate > 0 and random.random() < rate
+
+def profiled_view(route):
+    '''
+        Requests profiling of formatting jobs run by the view
+        when should_profile decides so.
+    '''
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not should_profile(request, route):
+                return view(request, *args, **kwargs)
+            token = _current.set(f'{time.strftime("%Y%m%d-%H%M%S")}-{route}-{uuid4().hex[:8]}')
+            try:
+                return view(request, *args, **kwargs)
+            finally:
+                _current.reset(token)
+        return wrapper
+    return decorator
+
+@contextmanager
+def profile(name):
+    '''
+        Runs the block under cProfile and tracemalloc.
+        Writes <name>.prof and <name>.alloc.txt to FORMATTING_PROFILE_DIR.
+    '''
+    start_tracing = not tracemalloc.is_tracing()
+    if start_tracing:
+        tracemalloc.start()
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        if start_tracing:
+            tracemalloc.stop()
+        directory = settings.FORMATTING_PROFILE_DIR
+        directory.mkdir(parents=True, exist_ok=True)
+        profiler.dump_stats(str(directory / f'{name}.prof'))
+        write_allocations(directory / f'{name}.alloc.txt', snapshot, peak)
+        remove_old_profiles(directory)
+
+def write_allocations(path, snapshot, peak):
+    snapshot = snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    ))
+    with open(path, 'w') as file:
+        file.write(f'Peak traced memory: {peak / 1024 / 1024:.2f} MB\n')
+        file.write(f'Top {TOP_ALLOCATIONS} allocations by line:\n')
+        for statistic in snapshot.statistics('lineno')[:TOP_ALLOCATIONS]:
+            file.write(f'{statistic}\n')
+
+def remove_old_profiles(directory):
+    '''
+        Keeps at most FORMATTING_PROFILE_MAX_FILES profile files
+        not older than FORMATTING_PROFILE_MAX_AGE seconds.
+    '''
+    now = time.time()
+    entries = []
+    for entry in os.scandir(directory):
+        try:
+            entries.append((entry.stat().st_mtime, entry.path))
+        except FileNotFoundError:
+            continue
+    entries.sort(reverse=True)
+    for i, (mtime, path) in enumerate(entries):
+        if i >= settings.FORMATTING_PROFILE_MAX_FILES or now - mtime > settings.FORMATTING_PROFILE_MAX_AGE:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,144 @@
+import os
+import shutil
+import hashlib
+from threading import Lock
+from tempfile import NamedTemporaryFile
+from django.conf import settings
+
+# Bump when formatting output changes, so that cached results are not reused.
+FORMATTER_VERSION = '1'
+
+
+def get_cache_key(data, hyphenation=False, profile=None, compression=None):
+    '''
+        Returns a content hash of the input document and formatting options.
+    '''
+    key = new_key(hyphenation, profile, compression)
+    key.update(data)
+    return key.hexdigest()
+
+def get_file_cache_key(file, hyphenation=False, profile=None, compression=None):
+    '''
+        Same as get_cache_key for an uploaded file, read chunk by chunk.
+    '''
+    key = new_key(hyphenation, profile, compression)
+    for chunk in file.chunks():
+        key.update(chunk)
+    return key.hexdigest()
+
+def new_key(hyphenation, profile, compression=None):
+    key = hashlib.sha256()
+    key.update(f'{FORMATTER_VERSION}:{int(bool(hyphenation))}:{profile or settings.FORMATTING_STYLE_PROFILE}:{compression or settings.FORMATTING_COMPRESSION}:'.encode())
+    return key
+
+
+class ResultCache:
+    '''
+        On-disk cache of formatted documents keyed by get_cache_key.
+        Least recently used documents are removed when the cache grows over max_size bytes.
+        Several processes can share one directory.
+    '''
+    def __init__(self, directory, max_size):
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    def open(self, key):
+        '''
+            Returns an open binary file with the cached document or None.
+        '''
+        if not self.enabled:
+            return None
+        path = self.__get_path(key)
+        try:
+            file = open(path, 'rb')
+        except FileNotFoundError:
+            self.__count(hit=False)
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.__count(hit=True)
+        return file
+
+    def put(self, key, formatted_doc):
+        if not self.enabled or len(formatted_doc) > self.max_size:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with NamedTemporaryFile(dir=self.directory, suffix='.tmp', delete=False) as file:
+            file.write(formatted_doc)
+        os.replace(file.name, self.__get_path(key))
+        self.evict()
+
+    def put_file(self, key, path):
+        '''
+            Stores a formatted document from a file, linking it into the cache where possible.
+        '''
+        if not self.enabled or os.path.getsize(path) > self.max_size:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with NamedTemporaryFile(dir=self.directory, suffix='.tmp', delete=False) as file:
+            temporary_path = file.name
+        try:
+            os.remove(temporary_path)
+            os.link(path, temporary_path)
+        except OSError:
+            shutil.copyfile(path, temporary_path)
+        os.replace(temporary_path, self.__get_path(key))
+        self.evict()
+
+    def evict(self):
+        '''
+            Removes least recently used documents until the cache fits into max_size.
+        '''
+        entries = []
+        size = 0
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith('.docx'):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            size += stat.st_size
+        entries.sort()
+        for _, entry_size, path in entries:
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
+
+    def __count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def __get_path(self, key):
+        return self.directory / f'{key}.docx'
+
+
+_result_cache = None
+
+
+def get_result_cache():
+    global _result_cache
+    if _result_cache is None:
+        _result_cache = ResultCache(settings.FORMATTED_CACHE_DIR, settings.FORMATTED_CACHE_MAX_SIZE)
+    return _result_cache
@@ -0,0 +1,372 @@
+from shutil import copyfileobj
+from functools import partial
+from tempfile import SpooledTemporaryFile
+from zipfile import ZipFile, ZIP_DEFLATED
+from django.conf import settings
+from lxml import etree
+from docx.enum.style import WD_STYLE_TYPE
+from docx.enum.text import WD_BREAK
+from docx.image.image import Image
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.opc.oxml import serialize_part_xml
+from docx.opc.packuri import PACKAGE_URI
+from docx.opc.pkgreader import _SerializedRelationships
+from docx.oxml import element_class_lookup
+from docx.oxml.ns import qn
+from docx.oxml.shape import CT_Inline
+from docx.oxml.xmlchemy import OxmlElement
+from docx.parts.image import ImagePart
+from docx.text.paragraph import Paragraph
+from .constants import StyleNameConstants
+from .doc_formatter import DocumentFormatter
+from .transforms import set_paragraph_style, unwrap_hyperlinks, reset_colors
+from .ImageExtractor import ImageExtractor
+from .image_optimizer import get_image_extents
+from .package_writer import write_package, write_blob, DEFAULT_POLICY
+from .paragraph_copy import clone_runs, clone_table
+from .paragraph_index import ParagraphClassifier, ParagraphKind, find_style_id
+from .prepare_doc import (
+    get_numbering_map, get_list_type_by_paragraph, get_list_num_id, get_style_num_id,
+    get_image_rIds, get_drawing_picture, has_graphic, count_drawings
+)
+from .templates import load_template
+from . import timing
+
+W_P = qn('w:p')
+W_TBL = qn('w:tbl')
+W_BODY = qn('w:body')
+# Body children the parser reports, anything else is dropped along with them.
+BODY_CHILDREN = (W_P, W_TBL, qn('w:sdt'))
+READ_SIZE = 64 * 1024
+# Formatted paragraphs kept in memory before they are written out.
+BATCH_SIZE = 256
+
+# Kinds in the order style_document styles them, the last one applied wins.
+STYLE_ORDER = (
+    (ParagraphKind.BULLET_LIST, StyleNameConstants.BULLET_LIST_STYLE),
+    (ParagraphKind.NUMBER_LIST, StyleNameConstants.NUMBER_LIST_STYLE),
+    (ParagraphKind.HEADER, StyleNameConstants.HEADER_STYLE),
+    (ParagraphKind.IMAGE, StyleNameConstants.IMAGE_STYLE),
+    (ParagraphKind.IMAGE_CAPTION, StyleNameConstants.IMAGE_CAPTION_STYLE),
+)
+
+
+class StreamingFormatter:
+    '''
+        Formats a document like prepare_to_format followed by style_document,
+        without building the object model of the source body.
+        The body is read twice with a pull parser, first for the text of headers,
+        then to copy, classify and style paragraphs and tables one at a time.
+        Formatted paragraphs are written to a temporary file in batches and images
+        are written to the destination as they are met, so memory use doesn't grow
+        with the length of the document.
+    '''
+    def __init__(self, path_to_document, hyphenation=False, image_optimizer=None, policy=DEFAULT_POLICY, style_profile=None):
+        self.path = path_to_document
+        self.hyphenation = hyphenation
+        self.style_profile = style_profile
+        self.image_optimizer = image_optimizer
+        self.policy = policy
+
+    def format(self, dest):
+        '''
+            Writes the formatted document to dest, a path or a binary file.
+        '''
+        with ImageExtractor(self.path) as source_images:
+            with timing.stage('open'):
+                self.source = DocumentFormatter(source_images.open_document(body=False), source_images)
+                self.numbering_map = get_numbering_map(self.source.get_numbering_object())
+            with timing.stage('classify'):
+                self.headers_text, self.extents = self.__read_headers(source_images)
+            with timing.stage('template'):
+                self.__prepare_template()
+            with ZipFile(dest, 'w', ZIP_DEFLATED, compresslevel=self.policy.level) as zip_file:
+                with SpooledTemporaryFile(max_size=settings.FORMATTED_DOCUMENT_SPOOL_SIZE) as body_file:
+                    with timing.stage('copy'):
+                        self.__copy_body(source_images, zip_file, body_file)
+                    with timing.stage('save'):
+                        self.__save(zip_file, body_file)
+
+    def __read_headers(self, source_images):
+        '''
+            Returns texts of the source headers and, for the image optimizer,
+            the largest displayed extent of every image.
+        '''
+        classifier = ParagraphClassifier(
+            find_style_id(self.source.document, 'List Number'),
+            find_style_id(self.source.document, 'List Bullet')
+        )
+        headers_text = []
+        extents = {}
+        for element in iter_body(source_images.open_part(self.source.document.part.partname)):
+            if self.image_optimizer is not None:
+                for rId, (cx, cy) in get_image_extents(element).items():
+                    previous = extents.get(rId, (0, 0))
+                    extents[rId] = (max(previous[0], cx), max(previous[1], cy))
+            if element.tag != W_P:
+                continue
+            # Colours don't change the text or kinds, only hyperlinks are removed.
+            unwrap_hyperlinks(element)
+            if ParagraphKind.HEADER in classifier.classify(element):
+                headers_text.append(Paragraph(element, None).text)
+        return headers_text, extents
+
+    def __prepare_template(self):
+        self.formatter = load_template(self.hyphenation, self.style_profile)
+        self.formatter.set_margins(self.formatter.style_profile.margins)
+        document = self.formatter.document
+        styles = document.styles
+
+        def get_style_id(name):
+            return document.part.get_style_id(styles[name], WD_STYLE_TYPE.PARAGRAPH)
+
+        self.style_ids = [(kind, get_style_id(name)) for kind, name in STYLE_ORDER]
+        self.text_style_id = get_style_id(StyleNameConstants.TEXT_STYLE)
+        self.bullet_style_id = get_style_id('List Bullet')
+        self.number_style_id = get_style_id('List Number')
+        self.get_cell_list_num_id = partial(
+            get_list_num_id,
+            self.source,
+            numbering_map=self.numbering_map,
+            bullet_num_id=get_style_num_id(styles['List Bullet']),
+            number_num_id=get_style_num_id(styles['List Number'])
+        )
+        self.classifier = ParagraphClassifier(
+            find_style_id(document, 'List Number'),
+            find_style_id(document, 'List Bullet')
+        )
+        self.captions = 0
+        self.next_shape_id = document.part.next_id
+        self.copied_images = 0
+        self.images = {}
+        self.image_parts = {}
+        self.written = set()
+
+        # The body of the template is split around its w:sectPr,
+        # formatted paragraphs are written between the two halves.
+        self.body = document.element.body
+        marker = etree.Comment('body')
+        self.body.insert(0, marker)
+        self.head, self.tail = serialize_part_xml(document.element).split(etree.tostring(marker))
+        self.body.clear()
+
+    def __copy_body(self, source_images, zip_file, body_file):
+        paragraphs = 0
+        tables = 0
+        unwrapped_hyperlinks = 0
+        recoloured_runs = 0
+        dropped_drawings = 0
+        copy_drawing = partial(self.__copy_drawing, zip_file)
+        for element in iter_body(source_images.open_part(self.source.document.part.partname)):
+            if element.tag == W_TBL:
+                tables += 1
+                copied_images = self.copied_images
+                table = clone_table(element, copy_drawing, self.get_cell_list_num_id)
+                dropped_drawings += count_drawings(element) - (self.copied_images - copied_images)
+                for p in table.iter(W_P):
+                    set_paragraph_style(p, self.text_style_id)
+                self.body.append(table)
+            elif element.tag == W_P:
+                paragraphs += 1
+                unwrapped_hyperlinks += unwrap_hyperlinks(element)
+                recoloured_runs += reset_colors(element)
+                for p in self.__copy_paragraph(Paragraph(element, None), zip_file):
+                    self.__style(p)
+                    self.body.append(p)
+            if len(self.body) >= BATCH_SIZE:
+                self.__flush(body_file)
+        self.__flush(body_file)
+        timing.add_facts(
+            paragraphs=paragraphs,
+            images=self.copied_images,
+            tables=tables,
+            unwrapped_hyperlinks=unwrapped_hyperlinks,
+            recoloured_runs=recoloured_runs,
+            dropped_drawings=dropped_drawings
+        )
+
+    def __copy_paragraph(self, paragraph, zip_file):
+        '''
+            Returns w:p elements copied from a source paragraph without hyperlinks the way prepare_to_format copies it.
+        '''
+        text = paragraph.text
+        if text in self.headers_text and text != self.headers_text[0]:
+            page_break = new_paragraph()
+            Paragraph(page_break, None).add_run().add_break(WD_BREAK.PAGE)
+            return [page_break, new_paragraph(text)]
+        if paragraph._p.get_or_add_pPr().numPr is not None:
+            list_type = get_list_type_by_paragraph(self.source, paragraph, self.numbering_map)
+            copied = new_paragraph(style_id=self.bullet_style_id if list_type == 'bullet' else self.number_style_id)
+        elif has_graphic(paragraph):
+            return [
+                self.__copy_image(rId, zip_file)
+                for rId in get_image_rIds(paragraph) if rId in self.source.rels
+            ]
+        else:
+            copied = new_paragraph()
+        clone_runs(paragraph, Paragraph(copied, None))
+        return [copied]
+
+    def __copy_image(self, rId, zip_file):
+        '''
+            Returns a paragraph with the image, as Document.add_picture adds it.
+        '''
+        p = new_paragraph()
+        p.add_r().add_drawing(self.__new_inline(rId, zip_file))
+        return p
+
+    def __copy_drawing(self, zip_file, drawing):
+        '''
+            Returns a w:drawing with the picture of a source w:drawing at its size in the source,
+            as prepare_doc's copy_drawing does, or None if it isn't a picture of the source package.
+        '''
+        picture = get_drawing_picture(drawing)
+        if picture is None or picture[0] not in self.source.rels:
+            return None
+        rId, cx, cy = picture
+        copied = OxmlElement('w:drawing')
+        copied.append(self.__new_inline(rId, zip_file, cx, cy))
+        return copied
+
+    def __new_inline(self, rId, zip_file, cx=None, cy=None):
+        '''
+            Returns a wp:inline with a source image, at its native size unless cx and cy are given.
+            Every image is written to the destination the first time it is met,
+            one image part per sha1 of the blob.
+        '''
+        if rId not in self.images:
+            raw = None
+            if rId in self.extents:
+                blob = self.image_optimizer.optimize(self.source.get_image_blob(rId), *self.extents[rId])
+            else:
+                raw = self.source.get_raw_image(rId)
+                blob = raw.content() if raw is not None else self.source.get_image_blob(rId)
+            image = Image.from_blob(blob)
+            if image.sha1 not in self.image_parts:
+                package = self.formatter.document.part.package
+                partname = package.image_parts._next_image_partname(image.ext)
+                image_part = ImagePart(partname, image.content_type, None)
+                package.image_parts.append(image_part)
+                write_blob(zip_file, partname.membername, blob, image.content_type, raw, self.policy)
+                self.written.add(partname)
+                self.image_parts[image.sha1] = self.formatter.document.part.relate_to(image_part, RT.IMAGE)
+            native_cx, native_cy = image.scaled_dimensions()
+            self.images[rId] = (self.image_parts[image.sha1], image.filename, native_cx, native_cy)
+        image_rId, filename, native_cx, native_cy = self.images[rId]
+        if cx is None:
+            cx, cy = native_cx, native_cy
+        inline = CT_Inline.new_pic_inline(self.next_shape_id, image_rId, filename, cx, cy)
+        self.next_shape_id += 1
+        self.copied_images += 1
+        return inline
+
+    def __style(self, p):
+        kinds = self.classifier.classify(p)
+        for kind, style_id in self.style_ids:
+            if kind not in kinds:
+                continue
+            if kind == ParagraphKind.IMAGE_CAPTION:
+                self.captions += 1
+                caption = Paragraph(p, None)
+                caption.text = f'Рисунок {self.captions} — ' + caption.text
+            set_paragraph_style(p, style_id)
+        if ParagraphKind.TEXT in kinds and p.style not in self.formatter.standard_style_ids:
+            set_paragraph_style(p, self.text_style_id)
+
+    def __flush(self, body_file):
+        '''
+            Writes paragraphs collected in the template body to the body file.
+            The whole document element is serialized, so that paragraphs don't repeat
+            namespace declarations of the root.
+        '''
+        if not len(self.body):
+            return
+        xml = etree.tostring(self.formatter.document.element, encoding='UTF-8')
+        start = xml.index(b'<w:body>') + len(b'<w:body>')
+        body_file.write(xml[start:xml.rindex(b'</w:body>')])
+        for element in self.body:
+            element.clear()
+        self.body.clear()
+
+    def __save(self, zip_file, body_file):
+        document_part = self.formatter.document.part
+        with zip_file.open(document_part.partname.membername, 'w') as member:
+            member.write(self.head)
+            body_file.seek(0)
+            copyfileobj(body_file, member)
+            member.write(self.tail)
+        self.written.add(document_part.partname)
+        write_package(zip_file, document_part.package, self.formatter.raw_members, self.policy, self.written)
+
+
+def stream_format(src, dest, hyphenation=False, image_optimizer=None, policy=DEFAULT_POLICY, style_profile=None):
+    '''
+        Formats a docx with StreamingFormatter.
+        src, dest - paths or binary files.
+        style_profile - name of a style profile, the default one for None.
+    '''
+    StreamingFormatter(src, hyphenation, image_optimizer, policy, style_profile).format(dest)
+
+def should_stream(src):
+    '''
+        Returns True if the main document part of src is larger than STREAMING_FORMATTING_MIN_SIZE.
+    '''
+    min_size = settings.STREAMING_FORMATTING_MIN_SIZE
+    if min_size is None:
+        return False
+    size = get_body_size(src)
+    return size is not None and size >= min_size
+
+def get_body_size(src):
+    '''
+        Returns the uncompressed size of the main document part of a docx
+        or None if it can't be found.
+    '''
+    try:
+        with ZipFile(src) as zip_file:
+            rels = _SerializedRelationships.load_from_xml(
+                PACKAGE_URI.baseURI, zip_file.read(PACKAGE_URI.rels_uri.membername)
+            )
+            for rel in rels:
+                if rel.reltype == RT.OFFICE_DOCUMENT and not rel.is_external:
+                    return zip_file.getinfo(rel.target_partname.membername).file_size
+    except (OSError, KeyError, ValueError, etree.XMLSyntaxError):
+        return None
+    return None
+
+def iter_body(stream):
+    '''
+        Yields children of w:body in a document part stream as python-docx elements,
+        as soon as each of them is parsed. A yielded child is removed from the tree
+        together with the siblings before it, so the tree never holds more than one.
+        Paragraphs of tables and other nested content are not yielded on their own.
+    '''
+    parser = etree.XMLPullParser(
+        events=('end',), tag=BODY_CHILDREN, remove_blank_text=True, resolve_entities=False
+    )
+    parser.set_element_class_lookup(element_class_lookup)
+    with stream:
+        for data in iter(lambda: stream.read(READ_SIZE), b''):
+            parser.feed(data)
+            yield from read_body_children(parser)
+    parser.close()
+    yield from read_body_children(parser)
+
+def read_body_children(parser):
+    for _, element in parser.read_events():
+        body = element.getparent()
+        if body is None or body.tag != W_BODY:
+            continue
+        yield element
+        # Cleared first, lxml is slow to move a large subtree out of its document.
+        for read in list(element.itersiblings(preceding=True)) + [element]:
+            read.clear()
+            body.remove(read)
+
+def new_paragraph(text=None, style_id=None):
+    p = OxmlElement('w:p')
+    if style_id is not None:
+        p.style = style_id
+    if text:
+        Paragraph(p, None).add_run(text)
+    return p
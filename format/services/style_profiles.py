@@ -0,0 +1,57 @@
+from django.conf import settings
+from .constants import (
+    HeaderConstants, TextConstants, PageConstants, ListConstants, ImageConstants, ImageCaptionConstants,
+    JournalHeaderConstants, JournalTextConstants, JournalPageConstants, JournalListConstants,
+    JournalImageCaptionConstants
+)
+
+
+class StyleProfile:
+    '''
+        Formatting standard: constants classes of every standard style and of the page.
+        Templates compile a profile into w:style elements once per process, see templates.
+    '''
+    def __init__(
+            self,
+            name,
+            header=HeaderConstants,
+            text=TextConstants,
+            list=ListConstants,
+            image=ImageConstants,
+            image_caption=ImageCaptionConstants,
+            page=PageConstants
+        ):
+        self.name = name
+        self.header = header
+        self.text = text
+        self.list = list
+        self.image = image
+        self.image_caption = image_caption
+        self.page = page
+
+    @property
+    def margins(self):
+        '''Margins as DocumentFormatter.set_margins takes them.'''
+        return (self.page.MARGIN_TOP, self.page.MARGIN_LEFT, self.page.MARGIN_BOTTOM, self.page.MARGIN_RIGHT)
+
+
+STYLE_PROFILES = {
+    'standard': StyleProfile('standard'),
+    'journal': StyleProfile(
+        'journal',
+        header=JournalHeaderConstants,
+        text=JournalTextConstants,
+        list=JournalListConstants,
+        image_caption=JournalImageCaptionConstants,
+        page=JournalPageConstants
+    ),
+}
+STANDARD_PROFILE = STYLE_PROFILES['standard']
+
+
+def get_style_profile(name=None):
+    '''
+        Returns the profile named in STYLE_PROFILES,
+        FORMATTING_STYLE_PROFILE for None.
+    '''
+    return STYLE_PROFILES[name or settings.FORMATTING_STYLE_PROFILE]
@@ -0,0 +1,99 @@
+from copy import deepcopy
+from threading import Lock
+from django.conf import settings
+from .doc_formatter import DocumentFormatter
+from .package_writer import get_raw_members, RawMember
+from .style_profiles import get_style_profile
+
+TEMPLATES = {
+    False: 'format/services/base.docx',
+    True: 'format/services/base-hyphen.docx',
+}
+
+_templates = {}
+_lock = Lock()
+
+
+def get_template_path(hyphenation=False):
+    return settings.BASE_DIR / TEMPLATES[bool(hyphenation)]
+
+def load_template(hyphenation=False, style_profile=None):
+    '''
+        Returns a formatter with an empty copy of the base template
+        and the standard styles of the named style profile, the default one for None.
+        The template is parsed once per process and parsed again only when its file changes,
+        every profile is compiled once per template, see compile_style_profile.
+    '''
+    profile = get_style_profile(style_profile)
+    pristine = get_pristine_template(get_template_path(hyphenation))
+    compiled = get_compiled_style_profile(pristine, profile)
+    formatter = copy_template(pristine)
+    formatter.style_profile = profile
+    formatter.inject_styles(compiled.fragments)
+    formatter.raw_members[compiled.styles_member_name] = compiled.styles_member
+    return formatter
+
+def copy_template(pristine):
+    package = deepcopy(pristine.document.part.package)
+    formatter = DocumentFormatter(package.main_document_part.document)
+    formatter.path = pristine.path
+    formatter.raw_members = dict(pristine.raw_members)
+    return formatter
+
+def get_pristine_template(path):
+    mtime = path.stat().st_mtime_ns
+    with _lock:
+        cached = _templates.get(path)
+        if cached is None or cached[0] != mtime:
+            cached = (mtime, build_template(path))
+            _templates[path] = cached
+    return cached[1]
+
+def build_template(path):
+    '''
+        Opens a template and removes its contents.
+        The result must never be modified, only copied.
+        Its parts are compressed once, so that saves of copies only compress changed parts.
+    '''
+    formatter = DocumentFormatter(path)
+    formatter.document._body.clear_content()
+    formatter.raw_members = get_raw_members(formatter.document.part.package)
+    formatter.style_profiles = {}
+    return formatter
+
+def get_compiled_style_profile(pristine, profile):
+    with _lock:
+        compiled = pristine.style_profiles.get(profile.name)
+        if compiled is None:
+            compiled = compile_style_profile(pristine, profile)
+            pristine.style_profiles[profile.name] = compiled
+    return compiled
+
+def compile_style_profile(pristine, profile):
+    '''
+        Builds the standard styles of a profile in a copy of the template.
+        Returns them as w:style elements, which are only ever copied,
+        along with the compressed styles part of a template they are injected into.
+    '''
+    formatter = copy_template(pristine)
+    formatter.style_profile = profile
+    formatter.add_standard_styles()
+    fragments = [deepcopy(style) for style in formatter.get_standard_style_elements()]
+    # Injected the same way load_template does, so that its styles part has exactly this content.
+    formatter.inject_styles(fragments)
+    styles_part = formatter.document.part._styles_part
+    return CompiledStyleProfile(fragments, styles_part.partname, RawMember.compress(styles_part.blob))
+
+def clear_template_cache():
+    with _lock:
+        _templates.clear()
+
+
+class CompiledStyleProfile:
+    '''
+        Standard styles of a style profile ready to be injected into copies of a template.
+    '''
+    def __init__(self, fragments, styles_member_name, styles_member):
+        self.fragments = fragments
+        self.styles_member_name = styles_member_name
+        self.styles_member = styles_member
@@ -0,0 +1,169 @@
+import json
+import logging
+from functools import wraps
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+from django.conf import settings
+from django.http import FileResponse
+
+logger = logging.getLogger('format.timing')
+
+_current = ContextVar('timings', default=None)
+
+
+class Timings:
+    '''
+        Durations of named stages and facts about the formatted document.
+        A stage entered several times accumulates its duration.
+    '''
+    def __init__(self):
+        self.stages = {}
+        self.facts = {}
+
+    def stage(self, name):
+        return Stage(self, name)
+
+    def add(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0) + seconds
+
+    def add_facts(self, **facts):
+        for name, value in facts.items():
+            self.facts[name] = self.facts.get(name, 0) + value
+
+    def add_max_facts(self, **facts):
+        '''
+            Keeps the largest reported value of each fact, e.g. peak memory.
+        '''
+        for name, value in facts.items():
+            self.facts[name] = max(self.facts.get(name, 0), value)
+
+    def merge(self, report):
+        for name, seconds in report['stages'].items():
+            self.add(name, seconds)
+        self.add_facts(**report['facts'])
+
+    def as_dict(self):
+        return {'stages': dict(self.stages), 'facts': dict(self.facts)}
+
+    def server_timing(self):
+        return ', '.join(
+            f'{name};dur={seconds * 1000:.1f}' for name, seconds in self.stages.items()
+        )
+
+
+class Stage:
+    def __init__(self, timings, name):
+        self.timings = timings
+        self.name = name
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.timings.add(self.name, perf_counter() - self.start)
+
+
+class NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+NULL_STAGE = NullStage()
+
+
+@contextmanager
+def collect():
+    '''
+        Collects stages and facts of the code run inside the block.
+    '''
+    timings = Timings()
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+def current():
+    return _current.get()
+
+def is_collecting():
+    return _current.get() is not None
+
+def stage(name):
+    '''
+        Times a block as a stage of the current collection.
+        Does nothing when nothing is collected.
+    '''
+    timings = _current.get()
+    if timings is None:
+        return NULL_STAGE
+    return timings.stage(name)
+
+def add_facts(**facts):
+    timings = _current.get()
+    if timings is not None:
+        timings.add_facts(**facts)
+
+def timed_view(view):
+    '''
+        Collects stages of a view when FORMATTING_TIMING is on.
+        Adds a Server-Timing header to the response and logs stages and facts as one JSON line.
+        Streaming responses other than files do their work after the view returns, their stages
+        are collected while the content is streamed and logged when it ends, without a Server-Timing header.
+    '''
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not settings.FORMATTING_TIMING:
+            return view(request, *args, **kwargs)
+        start = perf_counter()
+        with collect() as timings:
+            response = view(request, *args, **kwargs)
+        if response.streaming and not isinstance(response, FileResponse):
+            response.streaming_content = timed_stream(response.streaming_content, timings, start, view, request, response)
+            return response
+        timings.add('total', perf_counter() - start)
+        if response.has_header('Content-Length'):
+            timings.add_facts(output_bytes=int(response['Content-Length']))
+        response['Server-Timing'] = timings.server_timing()
+        log_timings(timings, view, request, response)
+        return response
+    return wrapper
+
+def timed_stream(content, timings, start, view, request, response):
+    '''
+        Yields chunks of streamed content, collecting stages into timings while each chunk is made.
+    '''
+    output_bytes = 0
+    try:
+        for chunk in iter_in_collection(content, timings):
+            output_bytes += len(chunk)
+            yield chunk
+    finally:
+        timings.add('total', perf_counter() - start)
+        timings.add_facts(output_bytes=output_bytes)
+        log_timings(timings, view, request, response)
+
+def iter_in_collection(iterable, timings):
+    iterator = iter(iterable)
+    while True:
+        token = _current.set(timings)
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            _current.reset(token)
+        yield item
+
+def log_timings(timings, view, request, response):
+    logger.info(json.dumps({
+        'view': view.__name__,
+        'path': request.path,
+        'status': response.status_code,
+        **timings.as_dict(),
+    }))
@@ -0,0 +1,71 @@
+'''
+    Normalisations of body paragraphs, each done in one XPath pass over the body.
+    Transforms take a w:body or a single w:p and return the number of nodes they changed.
+'''
+from lxml import etree
+from docx.oxml.ns import nsmap, qn
+from .paragraph_copy import set_black
+
+W_PPR = qn('w:pPr')
+W_PSTYLE = qn('w:pStyle')
+W_VAL = qn('w:val')
+
+NAMESPACES = {'w': nsmap['w']}
+# Paragraphs directly in the body, or the paragraph itself.
+PARAGRAPHS = '(self::w:p | ./w:p)'
+
+get_paragraphs = etree.XPath(PARAGRAPHS, namespaces=NAMESPACES)
+get_hyperlinks = etree.XPath(f'{PARAGRAPHS}/w:hyperlink', namespaces=NAMESPACES)
+get_runs = etree.XPath(f'{PARAGRAPHS}/w:r', namespaces=NAMESPACES)
+get_direct_fonts = etree.XPath(
+    f'{PARAGRAPHS}/w:r/w:rPr/*[self::w:rFonts or self::w:sz or self::w:szCs]',
+    namespaces=NAMESPACES
+)
+
+
+def unwrap_hyperlinks(element):
+    '''
+        Replaces hyperlinks of paragraphs with their content.
+    '''
+    links = get_hyperlinks(element)
+    for link in links:
+        for child in list(link):
+            link.addprevious(child)
+        link.getparent().remove(link)
+    return len(links)
+
+def reset_colors(element):
+    '''
+        Makes runs of paragraphs black. Runs of hyperlinks are only reached once they are unwrapped.
+    '''
+    runs = get_runs(element)
+    for run in runs:
+        set_black(run)
+    return len(runs)
+
+def strip_direct_fonts(element):
+    '''
+        Removes fonts and sizes set directly on runs of paragraphs, so that they come from styles.
+    '''
+    properties = get_direct_fonts(element)
+    for property in properties:
+        property.getparent().remove(property)
+    return len(properties)
+
+def set_paragraph_style(p, style_id):
+    '''
+        Same as setting p.style on a w:p element, without python-docx's lookups of the schema order.
+        w:pPr is the first child of w:p and w:pStyle the first child of w:pPr.
+    '''
+    pPr = p.find(W_PPR)
+    if pPr is None:
+        pPr = p.makeelement(W_PPR)
+        p.insert(0, pPr)
+    pStyle = pPr.find(W_PSTYLE)
+    if style_id is None:
+        if pStyle is not None:
+            pPr.remove(pStyle)
+    elif pStyle is None:
+        pPr.insert(0, pPr.makeelement(W_PSTYLE, {W_VAL: style_id}))
+    else:
+        pStyle.set(W_VAL, style_id)
@@ -0,0 +1,81 @@
+import asyncio
+from threading import Lock
+from contextvars import copy_context
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import close_old_connections
+from format.exceptions import ServerBusyException
+
+
+class BoundedExecutor:
+    '''
+        Thread pool for the blocking part of async views.
+        Holds at most max_pending jobs, running or waiting for a thread,
+        and refuses more with ServerBusyException instead of queueing them.
+        Database connections a job opens are closed as at the end of a request.
+    '''
+    def __init__(self, threads, max_pending):
+        self.max_pending = max_pending
+        self.pending = 0
+        self._pool = ThreadPoolExecutor(threads, thread_name_prefix='format-view')
+        self._lock = Lock()
+
+    def submit(self, function, *args):
+        '''
+            Returns a concurrent.futures.Future of function(*args),
+            run in a copy of the caller's context.
+        '''
+        with self._lock:
+            if self.pending >= self.max_pending:
+                raise ServerBusyException
+            self.pending += 1
+        try:
+            future = self._pool.submit(copy_context().run, run_with_connections, function, *args)
+        except Exception:
+            self.__done(None)
+            raise
+        future.add_done_callback(self.__done)
+        return future
+
+    async def run(self, function, *args, timeout=None):
+        '''
+            Awaits function(*args) run in the pool for at most timeout seconds,
+            raises asyncio.TimeoutError after that.
+            A job that already started when the time is up runs to its end
+            and keeps its place in the pool until then.
+        '''
+        return await asyncio.wait_for(asyncio.wrap_future(self.submit(function, *args)), timeout)
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
+
+    def __done(self, future):
+        with self._lock:
+            self.pending -= 1
+
+
+def run_with_connections(function, *args):
+    '''
+        Calls function(*args) between the connection cleanups Django does
+        around requests, threads of the pool never see request_finished.
+    '''
+    close_old_connections()
+    try:
+        return function(*args)
+    finally:
+        close_old_connections()
+
+
+_view_executor = None
+_view_executor_lock = Lock()
+
+
+def get_view_executor():
+    '''
+        Returns the process-wide executor of async views configured in settings.
+    '''
+    global _view_executor
+    with _view_executor_lock:
+        if _view_executor is None:
+            _view_executor = BoundedExecutor(settings.FORMATTING_VIEW_THREADS, settings.FORMATTING_VIEW_MAX_PENDING)
+    return _view_executor
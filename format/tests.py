@@ -1,3 +1,188 @@
-from django.test import TestCase
+from io import BytesIO
+from zipfile import ZipFile, ZIP_DEFLATED
+from unittest.mock import patch
+from docx import Document
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.oxml.ns import qn
+from docx.shared import Emu
+from django.test import SimpleTestCase
+from format.benchmarks.corpus import make_document, make_png, add_numbering
+from format.services.streaming import stream_format
+from format.services.package_writer import RawMember, read_raw_member, write_raw_member
+from format.services.prepare_doc import prepare_to_format
+from format.services.paragraph_cache import FormattedParagraphs
 
-# Create your tests here.
+
+def make_docx(*blocks):
+    '''
+        Returns bytes of a document with a paragraph for every text
+        and a one cell table for every None.
+    '''
+    document = Document()
+    for block in blocks:
+        if block is None:
+            document.add_table(rows=1, cols=1).cell(0, 0).text = 'Cell'
+        else:
+            document.add_paragraph(block)
+    output = BytesIO()
+    document.save(output)
+    return output.getvalue()
+
+def make_docx_without_numbering(*texts):
+    '''
+        Returns bytes of a document with a paragraph for every text and no numbering part.
+    '''
+    document = Document()
+    for text in texts:
+        document.add_paragraph(text)
+    part = document.part
+    for rId, rel in list(part.rels.items()):
+        if rel.reltype == RT.NUMBERING:
+            part.drop_rel(rId)
+    output = BytesIO()
+    document.save(output)
+    return output.getvalue()
+
+def make_table_docx():
+    '''
+        Returns bytes of a document with a table of a picture,
+        a centered paragraph and a bullet list item on its second level.
+    '''
+    document = Document()
+    _, bullet_list = add_numbering(document)
+    document.add_paragraph('Title')
+    cells = document.add_table(rows=1, cols=3).rows[0].cells
+    cells[0].paragraphs[0].add_run().add_picture(BytesIO(make_png(32, 24)), Emu(640000), Emu(480000))
+    cells[1].paragraphs[0].text = 'Centered'
+    cells[1].paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.CENTER
+    cells[2].paragraphs[0].text = 'Item'
+    numPr = cells[2].paragraphs[0]._p.get_or_add_pPr().get_or_add_numPr()
+    numPr.get_or_add_ilvl().val = 1
+    numPr.get_or_add_numId().val = bullet_list
+    output = BytesIO()
+    document.save(output)
+    return output.getvalue()
+
+def format_docx(data, formatted_paragraphs=None):
+    formatter = prepare_to_format(BytesIO(data), formatted_paragraphs=formatted_paragraphs)
+    formatter.style_document()
+    return formatter
+
+def get_paragraph_styles(formatter):
+    return [(p.text, p.style.style_id) for p in formatter.document.paragraphs]
+
+def save_docx(formatter, raw_members):
+    formatter.raw_members = raw_members
+    output = BytesIO()
+    formatter.save(output)
+    return ZipFile(output)
+
+
+class IncrementalFormattingTests(SimpleTestCase):
+    def test_first_paragraph_after_table_is_not_reused(self):
+        previous = FormattedParagraphs()
+        format_docx(make_docx(None, 'Title', 'Body'), previous)
+        data = make_docx('Inserted', None, 'Title', 'Body')
+
+        incremental = format_docx(data, FormattedParagraphs(previous.as_dict()))
+
+        self.assertEqual(get_paragraph_styles(incremental), get_paragraph_styles(format_docx(data)))
+
+    def test_table_with_picture_is_not_reused(self):
+        data = make_table_docx()
+        previous = FormattedParagraphs()
+        format_docx(data, previous)
+
+        incremental = format_docx(data, FormattedParagraphs(previous.as_dict()))
+
+        document = Document(save_docx(incremental, incremental.raw_members).fp)
+        rIds = document.tables[0]._tbl.xpath('.//a:blip/@r:embed')
+        self.assertEqual(len(rIds), 1)
+        self.assertEqual(document.part.related_parts[rIds[0]].content_type, 'image/png')
+
+
+class RawCopyTests(SimpleTestCase):
+    def setUp(self):
+        self.formatter = format_docx(make_document(20, lists=1, images=3))
+        self.raw_members = self.formatter.raw_members
+
+    def test_raw_copied_save_is_valid_zip(self):
+        self.assertIsNone(save_docx(self.formatter, self.raw_members).testzip())
+
+    def copy_member(self, content):
+        source = BytesIO()
+        with ZipFile(source, 'w', ZIP_DEFLATED) as zip_file:
+            zip_file.writestr('word/document.xml', content)
+        output = BytesIO()
+        with ZipFile(source) as zip_file, ZipFile(output, 'w') as copy:
+            member = read_raw_member(zip_file, 'word/document.xml')
+            if member is None:
+                member = RawMember.compress(zip_file.read('word/document.xml'))
+            write_raw_member(copy, 'word/document.xml', member)
+        return member, ZipFile(output)
+
+    def test_raw_member_round_trip(self):
+        content = b'<w:document/>' * 100
+        member, copy = self.copy_member(content)
+        self.assertTrue(member.matches(content))
+        self.assertIsNone(copy.testzip())
+        self.assertEqual(copy.read('word/document.xml'), content)
+
+    def test_raw_member_copy_without_zip_internals(self):
+        content = b'<w:document/>' * 100
+        with patch('format.services.package_writer.RAW_COPY_ZIP_ATTRIBUTES', ('_missing',)):
+            _, copy = self.copy_member(content)
+        self.assertIsNone(copy.testzip())
+        self.assertEqual(copy.read('word/document.xml'), content)
+
+    def test_raw_copied_save_matches_full_save(self):
+        raw_copied = save_docx(self.formatter, self.raw_members)
+        full = save_docx(self.formatter, None)
+
+        self.assertEqual(raw_copied.namelist(), full.namelist())
+        for name in full.namelist():
+            self.assertEqual(raw_copied.read(name), full.read(name), name)
+
+
+class TableCopyTests(SimpleTestCase):
+    def assert_cells_copied(self, document):
+        cells = document.tables[0].rows[0].cells
+        inline = cells[0]._tc.xpath('.//wp:inline')[0]
+        self.assertEqual((inline.extent.cx, inline.extent.cy), (640000, 480000))
+        self.assertEqual(document.part.related_parts[inline.xpath('.//a:blip/@r:embed')[0]].content_type, 'image/png')
+        self.assertEqual(cells[1].paragraphs[0].alignment, WD_ALIGN_PARAGRAPH.CENTER)
+        numPr = cells[2].paragraphs[0]._p.pPr.numPr
+        bullet_numPr = document.styles['List Bullet'].element.pPr.numPr
+        self.assertEqual((numPr.numId.val, numPr.ilvl.val), (bullet_numPr.numId.val, 1))
+
+    def test_cells_keep_pictures_alignment_and_lists(self):
+        formatter = format_docx(make_table_docx())
+        self.assertEqual(len(formatter.document.element.body.findall(f'.//{qn("w:drawing")}')), 1)
+        self.assert_cells_copied(Document(save_docx(formatter, formatter.raw_members).fp))
+
+    def test_streaming_cells_keep_pictures_alignment_and_lists(self):
+        output = BytesIO()
+        stream_format(BytesIO(make_table_docx()), output)
+        self.assert_cells_copied(Document(output))
+
+
+class NumberingTests(SimpleTestCase):
+    def setUp(self):
+        self.data = make_docx_without_numbering('Title', 'Body')
+        self.assertNotIn('word/numbering.xml', ZipFile(BytesIO(self.data)).namelist())
+
+    def test_document_without_numbering_part(self):
+        formatter = format_docx(self.data)
+        self.assertEqual([text for text, _ in get_paragraph_styles(formatter)], ['Title', 'Body'])
+
+    def test_streaming_document_without_numbering_part(self):
+        output = BytesIO()
+        stream_format(BytesIO(self.data), output)
+        self.assertEqual([p.text for p in Document(output).paragraphs], ['Title', 'Body'])
+
+
+class ViewTests(SimpleTestCase):
+    def test_get_is_not_found(self):
+        for url in ('/format/', '/format/archive/'):
+            self.assertEqual(self.client.get(url).status_code, 404, url)
@@ -4,5 +4,6 @@ from format import views
 app_name = 'format'
 
 urlpatterns = [
-    path('', views.format_docx, name='format')
+    path('', views.format_docx_async, name='format'),
+    path('archive/', views.format_docx_archive_async, name='format_archive'),
 ]
\ No newline at end of file
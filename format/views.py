@@ -1,25 +1,79 @@
+import os
+import asyncio
 from pathlib import Path
+from tempfile import SpooledTemporaryFile, NamedTemporaryFile
 from django.shortcuts import render, redirect
 from django.conf import settings
-from django.http import FileResponse
+from zipfile import is_zipfile
+from urllib.parse import quote
+from django.http import FileResponse, StreamingHttpResponse, HttpResponse
 from django.http import Http404
 from django.contrib import messages
-from format.services.prepare_doc import prepare_to_format
-from format.exceptions import TooLargeFileException, WrongFileExtensionException
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from format.services.executor import get_executor
+from format.services.view_executor import get_view_executor
+from format.services.result_cache import get_file_cache_key, get_result_cache
+from format.services.paragraph_cache import get_lineage_key, get_paragraph_cache
+from format.services.style_profiles import STYLE_PROFILES
+from format.services.batch import read_archive, stream_formatted_archive
+from format.services.timing import timed_view
+from format.services.profiling import profiled_view
+from format.services import timing
+from format.services import profiling
+from format.exceptions import TooLargeFileException, WrongFileExtensionException, WrongArchiveException, ServerBusyException
 
 
+async def format_docx_async(request):
+    '''
+        format_docx for ASGI servers.
+        The view runs in the bounded view executor, so that uploads being formatted
+        don't hold up the event loop and other requests.
+        Requests the executor has no room for or that miss FORMATTING_VIEW_DEADLINE
+        are answered with 503 and Retry-After.
+    '''
+    try:
+        return await get_view_executor().run(format_docx, request, timeout=settings.FORMATTING_VIEW_DEADLINE)
+    except (ServerBusyException, asyncio.TimeoutError):
+        return make_busy_response()
+
+
+async def format_docx_archive_async(request):
+    '''
+        format_docx_archive for ASGI servers, run in the bounded view executor like format_docx_async.
+        The archive is only checked here, its documents are formatted while the response streams,
+        see docx_format.asgi for how streamed chunks are kept off the event loop.
+    '''
+    try:
+        return await get_view_executor().run(format_docx_archive, request, timeout=settings.FORMATTING_VIEW_DEADLINE)
+    except (ServerBusyException, asyncio.TimeoutError):
+        return make_busy_response()
+
+
+@timed_view
+@profiled_view('format')
 def format_docx(request):
     if request.method == 'GET':
-        return Http404
+        raise Http404
     else:
-        doc = request.FILES.get('doc')
-        hyphen = request.POST.get('hyphen')
+        with timing.stage('upload'):
+            doc = request.FILES.get('doc')
+            hyphen = request.POST.get('hyphen')
         try:
             validate_document(doc)
-            create_documents_dir_if_not_exists()
-            formatted_doc = format_document(doc, hyphen)
-            formatted_doc.save(f'{settings.MEDIA_ROOT}/documents/formatted.docx')
-            return FileResponse(open(f'{settings.MEDIA_ROOT}/documents/formatted.docx', 'rb'))
+            hyphenation = hyphen == 'on'
+            compression = get_compression(request)
+            style_profile = get_style_profile_name(request)
+            timing.add_facts(input_bytes=doc.size)
+            with timing.stage('hash'):
+                key = get_file_cache_key(doc, hyphenation=hyphenation, profile=style_profile, compression=compression)
+            response = get_conditional_response(request, etag=quote_etag(key))
+            if response is None:
+                lineage = get_lineage(request, doc.name, hyphenation)
+                formatted_doc = format_document(doc, hyphenation, key, lineage, compression, style_profile)
+                response = make_download_response(formatted_doc, doc.name)
+            response['ETag'] = quote_etag(key)
+            return response
         except TooLargeFileException as e:
             messages.error(request, e.message)
         except WrongFileExtensionException as e:
@@ -27,6 +81,50 @@ def format_docx(request):
         return redirect('core:home')
     
 
+@timed_view
+@profiled_view('format_archive')
+def format_docx_archive(request):
+    if request.method == 'GET':
+        raise Http404
+    else:
+        with timing.stage('upload'):
+            archive = request.FILES.get('archive')
+            hyphen = request.POST.get('hyphen')
+        try:
+            validate_archive(archive)
+            with timing.stage('upload'):
+                names, manifest = read_archive(archive, validate_document)
+            timing.add_facts(input_bytes=archive.size)
+            response = StreamingHttpResponse(
+                stream_formatted_archive(
+                    archive,
+                    names,
+                    manifest,
+                    hyphenation=hyphen == 'on',
+                    compression=get_compression(request),
+                    style_profile=get_style_profile_name(request),
+                    profile_name=profiling.current()
+                ),
+                content_type='application/zip'
+            )
+            response['Content-Disposition'] = f"attachment; filename*=utf-8''{quote(get_archive_download_name(archive.name))}"
+            return response
+        except TooLargeFileException as e:
+            messages.error(request, e.message)
+        except WrongArchiveException as e:
+            messages.error(request, e.message)
+        return redirect('core:home')
+
+
+def validate_archive(archive):
+    if not archive:
+        raise WrongArchiveException
+    if archive.size > settings.MAX_ARCHIVE_SIZE:
+        raise TooLargeFileException
+    if not is_zipfile(archive):
+        raise WrongArchiveException
+    archive.seek(0)
+
 def validate_document(doc):
     if not doc:
         raise WrongFileExtensionException
@@ -35,15 +133,123 @@ def validate_document(doc):
     if doc.size > settings.MAX_DOCUMENT_SIZE:
         raise TooLargeFileException
 
-def create_documents_dir_if_not_exists():
-    document_dir = Path(f'{settings.MEDIA_ROOT}/documents')
-    document_dir.mkdir(parents=True, exist_ok=True)
+def make_download_response(formatted_doc, upload_name):
+    '''
+        Streams the formatted document from an open binary file.
+    '''
+    formatted_doc.seek(0, os.SEEK_END)
+    size = formatted_doc.tell()
+    formatted_doc.seek(0)
+    response = FileResponse(
+        formatted_doc,
+        as_attachment=True,
+        filename=get_download_name(upload_name),
+        content_type=settings.VALID_EXTENSION
+    )
+    response['Content-Length'] = size
+    return response
+
+def make_busy_response():
+    response = HttpResponse(ServerBusyException().message, status=503, content_type='text/plain; charset=utf-8')
+    response['Retry-After'] = settings.FORMATTING_VIEW_RETRY_AFTER
+    return response
+
+def get_download_name(upload_name):
+    return f'{Path(upload_name).stem}_formatted.docx'
+
+def get_archive_download_name(upload_name):
+    return f'{Path(upload_name).stem}_formatted.zip'
 
-def format_document(doc, hyphen):
-    if hyphen == 'on':
-        hyphen = True
+def get_compression(request):
+    '''
+        Returns the compression policy name the request asks for,
+        None for the default policy or an unknown name.
+    '''
+    compression = request.POST.get('compression')
+    if compression not in settings.FORMATTING_COMPRESSION_POLICIES:
+        return None
+    return compression
+
+def get_style_profile_name(request):
+    '''
+        Returns the style profile name the request asks for,
+        None for the default profile or an unknown name.
+    '''
+    style_profile = request.POST.get('style_profile')
+    if style_profile not in STYLE_PROFILES:
+        return None
+    return style_profile
+
+def get_lineage(request, upload_name, hyphenation):
+    '''
+        Returns the key of documents the user uploads under this name
+        or None when incremental formatting is off.
+        Anonymous users are told apart by their session, uploads without one
+        are not formatted incrementally, so that they don't create sessions and lineages.
+    '''
+    if not get_paragraph_cache().enabled:
+        return None
+    if request.user.is_authenticated:
+        owner = f'user:{request.user.pk}'
+    elif request.session.session_key is not None:
+        owner = f'session:{request.session.session_key}'
     else:
-        hyphen = False
-    formatted_doc = prepare_to_format(doc, hyphenation=hyphen)
-    formatted_doc.style_document()
-    return formatted_doc
+        return None
+    return get_lineage_key(owner, upload_name, hyphenation)
+
+def format_document(doc, hyphenation, key, lineage=None, compression=None, style_profile=None):
+    '''
+        Returns an open binary file with the formatted document.
+        Documents found in the result cache are not formatted again,
+        whether the cache had the document is reported as the cache_hit fact.
+        Uploads that Django spooled to disk are formatted from and to files,
+        others in memory.
+    '''
+    result_cache = get_result_cache()
+    with timing.stage('cache'):
+        cached_doc = result_cache.open(key)
+    if result_cache.enabled:
+        timing.add_facts(cache_hit=int(cached_doc is not None))
+    if cached_doc is not None:
+        return cached_doc
+    if hasattr(doc, 'temporary_file_path'):
+        return format_document_on_disk(doc.temporary_file_path(), hyphenation, key, lineage, compression, style_profile)
+
+    with timing.stage('upload'):
+        doc.seek(0)
+        data = doc.read()
+    with timing.stage('format'):
+        formatted_doc = get_executor().format(
+            data,
+            hyphenation=hyphenation,
+            lineage=lineage,
+            compression=compression,
+            style_profile=style_profile
+        )
+    with timing.stage('cache'):
+        result_cache.put(key, formatted_doc)
+    output = SpooledTemporaryFile(max_size=settings.FORMATTED_DOCUMENT_SPOOL_SIZE)
+    output.write(formatted_doc)
+    return output
+
+def format_document_on_disk(path, hyphenation, key, lineage=None, compression=None, style_profile=None):
+    '''
+        Formats a document into a temporary file that is removed once the response closes it.
+    '''
+    output = NamedTemporaryFile(suffix='.docx', dir=settings.FILE_UPLOAD_TEMP_DIR)
+    try:
+        with timing.stage('format'):
+            get_executor().format_file(
+                path,
+                output.name,
+                hyphenation=hyphenation,
+                lineage=lineage,
+                compression=compression,
+                style_profile=style_profile
+            )
+        with timing.stage('cache'):
+            get_result_cache().put_file(key, output.name)
+    except Exception:
+        output.close()
+        raise
+    return output